@@ -0,0 +1,235 @@
+"""
+Offline throughput benchmark for the deck generation pipeline.
+
+Starts a local stand-in for Ollama's streaming /api/generate with configurable
+latency, jitter, error rate, malformed-JSON rate and runaway (chatty) rate,
+then runs main.main() over synthetic word lists and reports cards/sec,
+retries and where the time went.
+
+    python benchmark.py --sizes 1000 10000 100000 --latency 0.05 --error-rate 0.02
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import main
+
+CHUNK_CHARS = 40  # characters per streamed NDJSON chunk
+
+def fake_card(word):
+    return {
+        "word": word,
+        "source": f"meaning of {word}",
+        "source_example": f"This is an example with {word}.",
+        "target_example": f"これは{word}の例です。",
+        "word_furigana": "たんご",
+        "sentence_furigana": "これはたんごのれいです。",
+        "romanization": "tango"
+    }
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    # Settings are attached to the server instance by start_fake_ollama.
+    # Like Ollama, responses are chunked over keep-alive connections
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        settings = self.server.settings
+        prompt = body.get("prompt")
+
+        if prompt and random.random() < settings["error_rate"]:
+            time.sleep(max(0.0, random.gauss(settings["latency"], settings["jitter"])))
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if not prompt:
+            # Model preload request
+            text = ""
+        else:
+            words = re.findall(r"^- 「(.*)」$", prompt, re.MULTILINE)
+            if words:
+                text = json.dumps([fake_card(word) for word in words], ensure_ascii=False)
+            else:
+                text = json.dumps(fake_card(re.search(r"「(.*?)」", prompt).group(1)), ensure_ascii=False)
+            if random.random() < settings["malformed_rate"]:
+                text = text[:len(text) // 2]
+            elif random.random() < settings["runaway_rate"]:
+                # A model that keeps talking after the JSON
+                text += "\n\nNote: " + "this card was generated carefully. " * 100
+
+        # NDJSON stream, spreading the latency over the chunks like a real
+        # generation and ending with a separate empty "done" line as Ollama
+        # does; the client may hang up early, which is fine
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pieces = [text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)]
+        per_piece = max(0.0, random.gauss(settings["latency"], settings["jitter"])) / max(len(pieces), 1) if prompt else 0.0
+        lines = [{"response": piece, "done": False} for piece in pieces]
+        lines.append({"response": "", "done": True, "done_reason": "stop"})
+        try:
+            for line in lines:
+                time.sleep(per_piece if not line["done"] else 0.0)
+                self.write_chunk((json.dumps(line) + "\n").encode("utf-8"))
+            self.write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients hang up on streams they stop early and on pooled
+        # connections at exit; anything else is worth a traceback
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+def start_fake_ollama(latency, jitter, error_rate, malformed_rate, runaway_rate):
+    server = FakeOllamaServer(("127.0.0.1", 0), FakeOllamaHandler)
+    server.daemon_threads = True
+    server.settings = {
+        "latency": latency,
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "malformed_rate": malformed_rate,
+        "runaway_rate": runaway_rate
+    }
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Timer:
+    """Accumulates time spent inside wrapped functions, across threads."""
+    def __init__(self):
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def wrap(self, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.total += time.perf_counter() - start
+        return timed
+
+
+def run_once(size, server_url, args):
+    work_dir = tempfile.mkdtemp(prefix="ll_helper_bench_")
+    cwd = os.getcwd()
+    originals = {name: getattr(main, name) for name in (
+        "ask_ai", "append_to_journal", "compact_deck", "load_existing_deck",
+        "ollama", "rate_controller", "response_cache", "MAX_WORDS", "MAX_WORKERS", "BATCH_SIZE"
+    )}
+
+    model_timer, io_timer = Timer(), Timer()
+    try:
+        os.chdir(work_dir)
+        with open(main.INPUT_FILE, "w", encoding="utf-8") as f:
+            for i in range(size):
+                f.write(f"単語{i}\n")
+
+        main.MAX_WORDS = size
+        main.MAX_WORKERS = args.workers
+        main.BATCH_SIZE = args.batch_size
+        main.rate_controller = main.RateController()
+        main.ollama = main.OllamaClient(
+            base_url=server_url,
+            pool_size=args.workers,
+            backoff=args.backoff,
+            rate_controller=main.rate_controller
+        )
+        main.response_cache = main.ResponseCache() if args.cache else None
+        main.ask_ai = model_timer.wrap(originals["ask_ai"])
+        main.append_to_journal = io_timer.wrap(originals["append_to_journal"])
+        main.compact_deck = io_timer.wrap(originals["compact_deck"])
+        main.load_existing_deck = io_timer.wrap(originals["load_existing_deck"])
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.main()
+        wall = time.perf_counter() - start
+
+        with open(main.OUTPUT_FILE, "r", encoding="utf-8") as f:
+            cards = len(json.load(f)["cards"])
+        stats = main.ollama.stats()
+    finally:
+        for name, value in originals.items():
+            setattr(main, name, value)
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "size": size,
+        "cards": cards,
+        "wall": wall,
+        "cards_per_sec": cards / wall if wall else 0.0,
+        "calls": stats["calls"],
+        "retries": stats["retries"],
+        "failures": stats["failures"],
+        "cut_short": stats["cut_short"],
+        "model_time": model_timer.total,
+        "io_time": io_timer.total
+    }
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark LL-Helper deck generation against a fake Ollama server.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--latency", type=float, default=0.02, help="mean seconds to stream a full response")
+    parser.add_argument("--jitter", type=float, default=0.005, help="standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with HTTP 500")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of responses with truncated JSON")
+    parser.add_argument("--runaway-rate", type=float, default=0.0, help="fraction of responses that keep talking after the JSON")
+    parser.add_argument("--workers", type=int, default=main.MAX_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=main.BATCH_SIZE)
+    parser.add_argument("--backoff", type=float, default=main.RETRY_BACKOFF)
+    parser.add_argument("--cache", action="store_true", help="enable the on-disk response cache")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    server = start_fake_ollama(args.latency, args.jitter, args.error_rate, args.malformed_rate, args.runaway_rate)
+    server_url = f"http://127.0.0.1:{server.server_port}"
+
+    print(
+        f"{'words':>8} {'cards':>8} {'wall s':>9} {'cards/s':>9} {'calls':>7} "
+        f"{'retries':>8} {'fails':>6} {'cut short':>10} {'model s':>9} {'deck I/O s':>11}"
+    )
+    try:
+        for size in args.sizes:
+            r = run_once(size, server_url, args)
+            print(
+                f"{r['size']:>8} {r['cards']:>8} {r['wall']:>9.2f} {r['cards_per_sec']:>9.1f} {r['calls']:>7} "
+                f"{r['retries']:>8} {r['failures']:>6} {r['cut_short']:>10} {r['model_time']:>9.2f} {r['io_time']:>11.2f}"
+            )
+    finally:
+        server.shutdown()
+
+    print("\nmodel s = time spent in ask_ai summed over workers; deck I/O s = journal, compaction and load time")
+
+
+if __name__ == "__main__":
+    main_benchmark()
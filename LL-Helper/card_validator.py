@@ -0,0 +1,131 @@
+import re
+import unicodedata
+
+# Hepburn romaji for each hiragana; digraphs are listed first so they win
+KANA_TO_ROMAJI = {
+    "きゃ": "kya", "きゅ": "kyu", "きょ": "kyo",
+    "しゃ": "sha", "しゅ": "shu", "しょ": "sho", "しぇ": "she",
+    "ちゃ": "cha", "ちゅ": "chu", "ちょ": "cho", "ちぇ": "che",
+    "にゃ": "nya", "にゅ": "nyu", "にょ": "nyo",
+    "ひゃ": "hya", "ひゅ": "hyu", "ひょ": "hyo",
+    "みゃ": "mya", "みゅ": "myu", "みょ": "myo",
+    "りゃ": "rya", "りゅ": "ryu", "りょ": "ryo",
+    "ぎゃ": "gya", "ぎゅ": "gyu", "ぎょ": "gyo",
+    "じゃ": "ja", "じゅ": "ju", "じょ": "jo", "じぇ": "je",
+    "ぢゃ": "ja", "ぢゅ": "ju", "ぢょ": "jo",
+    "びゃ": "bya", "びゅ": "byu", "びょ": "byo",
+    "ぴゃ": "pya", "ぴゅ": "pyu", "ぴょ": "pyo",
+    "ふぁ": "fa", "ふぃ": "fi", "ふぇ": "fe", "ふぉ": "fo",
+    "てぃ": "ti", "でぃ": "di", "とぅ": "tu", "どぅ": "du",
+    "うぃ": "wi", "うぇ": "we", "うぉ": "wo",
+    "あ": "a", "い": "i", "う": "u", "え": "e", "お": "o",
+    "か": "ka", "き": "ki", "く": "ku", "け": "ke", "こ": "ko",
+    "さ": "sa", "し": "shi", "す": "su", "せ": "se", "そ": "so",
+    "た": "ta", "ち": "chi", "つ": "tsu", "て": "te", "と": "to",
+    "な": "na", "に": "ni", "ぬ": "nu", "ね": "ne", "の": "no",
+    "は": "ha", "ひ": "hi", "ふ": "fu", "へ": "he", "ほ": "ho",
+    "ま": "ma", "み": "mi", "む": "mu", "め": "me", "も": "mo",
+    "や": "ya", "ゆ": "yu", "よ": "yo",
+    "ら": "ra", "り": "ri", "る": "ru", "れ": "re", "ろ": "ro",
+    "わ": "wa", "ゐ": "i", "ゑ": "e", "を": "o", "ん": "n",
+    "が": "ga", "ぎ": "gi", "ぐ": "gu", "げ": "ge", "ご": "go",
+    "ざ": "za", "じ": "ji", "ず": "zu", "ぜ": "ze", "ぞ": "zo",
+    "だ": "da", "ぢ": "ji", "づ": "zu", "で": "de", "ど": "do",
+    "ば": "ba", "び": "bi", "ぶ": "bu", "べ": "be", "ぼ": "bo",
+    "ぱ": "pa", "ぴ": "pi", "ぷ": "pu", "ぺ": "pe", "ぽ": "po",
+    "ゔ": "vu",
+    "ぁ": "a", "ぃ": "i", "ぅ": "u", "ぇ": "e", "ぉ": "o",
+    "ゃ": "ya", "ゅ": "yu", "ょ": "yo", "ゎ": "wa",
+}
+
+# Particles read differently when they make up the whole word
+PARTICLE_READINGS = {"は": "wa", "へ": "e", "を": "o"}
+
+HIRAGANA_WORD = re.compile(r"^[ぁ-ゖー]+$")
+# Sentences may also carry punctuation and spacing
+HIRAGANA_SENTENCE = re.compile(r"^[ぁ-ゖー\s、。，．！？!?「」『』・…〜]+$")
+
+MACRONS = {"ā": "aa", "ī": "ii", "ū": "uu", "ē": "ee", "ō": "ou", "â": "aa", "î": "ii", "û": "uu", "ê": "ee", "ô": "ou"}
+
+
+def kana_to_romaji(kana):
+    """Converts a hiragana reading to Hepburn romaji."""
+    if kana in PARTICLE_READINGS:
+        return PARTICLE_READINGS[kana]
+
+    result = []
+    double_next = False
+    i = 0
+    while i < len(kana):
+        pair, char = kana[i:i + 2], kana[i]
+        if char == "っ":
+            double_next = True
+            i += 1
+            continue
+        if char == "ー":
+            # Long vowel mark repeats the previous vowel
+            if result and result[-1]:
+                result.append(result[-1][-1])
+            i += 1
+            continue
+
+        if pair in KANA_TO_ROMAJI:
+            romaji = KANA_TO_ROMAJI[pair]
+            i += 2
+        else:
+            romaji = KANA_TO_ROMAJI.get(char, "")
+            i += 1
+
+        if double_next and romaji:
+            romaji = ("t" if romaji.startswith("ch") else romaji[0]) + romaji
+            double_next = False
+        result.append(romaji)
+
+    return "".join(result)
+
+
+def normalize_romaji(text):
+    # Folds the spelling variants models use: macrons, ou/oo/uu long vowels,
+    # wo for を, m for ん before b/p, n' and spacing or hyphens between morae
+    text = unicodedata.normalize("NFC", text.lower())
+    text = "".join(MACRONS.get(char, char) for char in text)
+    text = re.sub(r"[^a-z]", "", text)
+    text = re.sub(r"m(?=[bp])", "n", text.replace("wo", "o"))
+    for long_vowel, short_vowel in (("ou", "o"), ("oo", "o"), ("uu", "u"), ("aa", "a"), ("ii", "i"), ("ee", "e")):
+        text = text.replace(long_vowel, short_vowel)
+    return text
+
+
+def find_card_problems(card, required_fields):
+    """
+    Runs the local structural checks on a deck card and returns a list of
+    problems; an empty list means the card does not need model verification.
+    """
+    extras = card.get("extras", {})
+    fields = {field: card.get(field, extras.get(field, "")) for field in required_fields}
+    problems = [f"campo vazio: {field}" for field, value in fields.items() if not str(value).strip()]
+    if problems:
+        return problems
+
+    word_furigana = fields["word_furigana"].strip()
+    if not HIRAGANA_SENTENCE.match(fields["sentence_furigana"].strip()):
+        problems.append("sentence_furigana não é só hiragana")
+    if not HIRAGANA_WORD.match(word_furigana):
+        problems.append("word_furigana não é só hiragana")
+    elif normalize_romaji(kana_to_romaji(word_furigana)) != normalize_romaji(fields["romanization"]):
+        problems.append("romanization não corresponde a word_furigana")
+
+    target = card.get("target", "")
+    example = fields["target_example"]
+    # Conjugated verbs/adjectives only keep their stem in the example sentence;
+    # する verbs conjugate both kana (勉強する → 勉強します)
+    if target.endswith("する") and len(target) > 2:
+        stem = target[:-2]
+    elif len(target) > 1 and HIRAGANA_WORD.match(target[-1]):
+        stem = target[:-1]
+    else:
+        stem = target
+    if target not in example and stem not in example:
+        problems.append("target_example não contém a palavra")
+
+    return problems
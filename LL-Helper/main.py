@@ -2,18 +2,61 @@ import requests
 import json
 import time
 import os
+import hashlib
+import threading
+import unicodedata
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from card_validator import find_card_problems
 
 TARGET_LANGUAGE = "japanese"
 MODEL_NAME = "gemma3:12b"
+OLLAMA_URL = "http://localhost:11434"
+REQUEST_TIMEOUT = (5, 300)  # (connect, read) seconds; a 12B model can be slow to answer
+MAX_RETRIES = 3
+RETRY_BACKOFF = 2.0  # seconds, doubled on each retry
+KEEP_ALIVE = "30m"  # keep the model loaded in Ollama between calls
 MAX_WORDS = 10000
 INPUT_FILE = "words.txt"
 OUTPUT_FILE = f"{TARGET_LANGUAGE}_deck.json"
+MAX_WORKERS = 4  # concurrent requests to Ollama (1 = sequential)
+REQUEST_DELAY = 1.5  # initial pause between requests, adapted to the server's latency
+MIN_REQUEST_DELAY = 0.05
+MAX_REQUEST_DELAY = 30.0
+DEGRADED_LATENCY_FACTOR = 2.0  # back off when latency exceeds this multiple of the best seen...
+DEGRADED_LATENCY_SLACK = 0.25  # ...and is at least this many seconds above it
+JOURNAL_FILE = f"{TARGET_LANGUAGE}_deck.journal.jsonl"
+COMPACT_EVERY = 200  # cards appended to the journal between full deck rewrites
+BATCH_SIZE = 5  # new words asked per request (1 = one word per request)
+VERIFY_ALL_CARDS = False  # True sends every existing card to the model, even if it passes the local checks
+USE_CACHE = True  # set to False to always ask the model
+CACHE_DIR = "llm_cache"
+CACHE_MAX_BYTES = 200 * 1024 * 1024  # least recently used responses are evicted past this
+MAX_JSON_PREAMBLE = 200  # characters allowed before the JSON starts (e.g. a ```json fence)
+MAX_RESPONSE_CHARS = 8000  # streamed responses longer than this are treated as runaway
+MAX_TRAILING_CHUNKS = 32  # chunks read after the JSON closes while waiting for the final "done"
 
 REQUIRED_FIELDS = [
     "source", "source_example", "target_example",
-    "furigana", "furigana_example", "romanization"
+    "word_furigana", "sentence_furigana", "romanization"
 ]
 
+# JSON schemas passed as Ollama's structured output `format`
+CARD_SCHEMA = {
+    "type": "object",
+    "properties": {field: {"type": "string"} for field in REQUIRED_FIELDS},
+    "required": REQUIRED_FIELDS
+}
+BATCH_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"word": {"type": "string"}, **CARD_SCHEMA["properties"]},
+        "required": ["word"] + REQUIRED_FIELDS
+    }
+}
+
 PROMPT_TEMPLATE = """[INST]
 You are a precise Japanese language assistant. Create flashcard data EXACTLY as specified.
 
@@ -56,21 +99,405 @@ Here is the existing data for this word. If all values are correct and match the
 """
 
 
-def ask_ai(prompt):
+BATCH_PROMPT_TEMPLATE = """[INST]
+You are a precise Japanese language assistant. Create flashcard data EXACTLY as specified.
+
+For EACH of these Japanese words/phrases:
+{word_list}
+
+Provide these details in CLEAN JSON ONLY (no commentary), one object per word:
+
+1. "word": The word/phrase exactly as given above
+2. "source": English translation (short, literal)
+3. "target_example": Natural Japanese sentence using the word (polite/neutral)
+4. "source_example": Direct English translation of above sentence
+5. "word_furigana": Reading of the word in hiragana only
+6. "sentence_furigana": Full sentence reading in hiragana
+7. "romanization": Romaji of the word
+
+RULES:
+- Convert verbs to dictionary form (〜ます → 〜る)
+- Convert adjectives to dictionary form (きれいです → きれいだ)
+- For kanji without common reading, use [漢字|ふりがな] format
+- Never add explanations or notes
+
+Output ONLY a JSON array in this format:
+```json
+[
+  {{
+    "word": "...",
+    "source": "...",
+    "source_example": "...",
+    "target_example": "...",
+    "word_furigana": "...",
+    "sentence_furigana": "...",
+    "romanization": "..."
+  }}
+]
+```[/INST]
+"""
+
+
+class RateController:
+    """
+    Adaptive pacing for model requests: the delay between request starts
+    shrinks while latency stays healthy and grows on errors, timeouts or
+    latency well above the best observed so far. Latency is tracked per
+    request kind, since a batch prompt is expected to take longer than a
+    single word.
+    """
+    def __init__(self, initial_delay=REQUEST_DELAY, min_delay=MIN_REQUEST_DELAY,
+                 max_delay=MAX_REQUEST_DELAY, degraded_factor=DEGRADED_LATENCY_FACTOR,
+                 degraded_slack=DEGRADED_LATENCY_SLACK):
+        self.delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.degraded_factor = degraded_factor
+        self.degraded_slack = degraded_slack
+        self.latency = {}  # kind -> (smoothed latency, baseline latency)
+        self.in_flight = 0
+        self.waiting = 0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.delay
+            self.waiting += 1
+        time.sleep(slot - now)
+        with self._lock:
+            self.waiting -= 1
+            self.in_flight += 1
+
+    def record(self, latency=None, error=None, kind="card"):
+        # Without latency or error (e.g. a 4xx) the request only leaves the
+        # in-flight count: it says nothing about the server's load
+        with self._lock:
+            self.in_flight -= 1
+            if error is not None:
+                # Timeouts mean the server is saturated, so back off harder
+                factor = 4 if isinstance(error, requests.Timeout) else 2
+                self.delay = min(self.max_delay, max(self.delay, 0.5) * factor)
+                return
+            if latency is None:
+                return
+
+            if kind not in self.latency:
+                smoothed = baseline = latency
+            else:
+                smoothed, baseline = self.latency[kind]
+                smoothed = 0.8 * smoothed + 0.2 * latency
+                # The baseline creeps up slowly so a lasting slowdown (e.g. longer
+                # prompts) is eventually accepted as the new normal
+                baseline = min(smoothed, baseline * 1.01)
+            self.latency[kind] = (smoothed, baseline)
+
+            threshold = max(baseline * self.degraded_factor, baseline + self.degraded_slack)
+            if smoothed > threshold:
+                self.delay = min(self.max_delay, max(self.delay, self.min_delay) * 1.5)
+            else:
+                self.delay = max(self.min_delay, self.delay * 0.75)
+
+    @property
+    def rate(self):
+        return 1 / self.delay
+
+class JsonStreamScanner:
+    """
+    Follows the nesting of a streamed JSON response so generation can stop
+    as soon as the top-level value is complete, or once it clearly went wrong
+    (too much text before it, mismatched brackets or a runaway length).
+    """
+    PAIRS = {"}": "{", "]": "["}
+
+    def __init__(self, max_preamble=MAX_JSON_PREAMBLE, max_chars=MAX_RESPONSE_CHARS):
+        self.max_preamble = max_preamble
+        self.max_chars = max_chars
+        self.state = "open"
+        self.seen = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        for char in text:
+            self.seen += 1
+            if not self._stack:
+                if char in "{[":
+                    self._stack.append(char)
+                elif self.seen > self.max_preamble:
+                    self.state = "invalid"
+                    break
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack.pop() != self.PAIRS[char]:
+                    self.state = "invalid"
+                    break
+                if not self._stack:
+                    self.state = "complete"
+                    break
+
+        if self.state == "open" and self.seen > self.max_chars:
+            self.state = "invalid"
+        return self.state
+
+class OllamaClient:
+    """
+    Reusable client for the Ollama generate API, with a pooled HTTP session,
+    timeouts, bounded retries with backoff and model keep-alive.
+    """
+    def __init__(self, base_url=OLLAMA_URL, model=MODEL_NAME, pool_size=MAX_WORKERS,
+                 timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES,
+                 backoff=RETRY_BACKOFF, keep_alive=KEEP_ALIVE, rate_controller=None):
+        self.url = base_url.rstrip("/") + "/api/generate"
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.keep_alive = keep_alive
+        self.rate_controller = rate_controller
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.latencies = []  # seconds per successful call
+        self.retries = 0
+        self.failures = 0
+        self.cut_short = 0  # streams closed early because the output was invalid or runaway
+        self._lock = threading.Lock()
+
+    def preload(self):
+        # An empty prompt makes Ollama load the model without generating anything
+        try:
+            self.session.post(
+                self.url,
+                json={"model": self.model, "keep_alive": self.keep_alive},
+                timeout=self.timeout
+            ).raise_for_status()
+            return True
+        except requests.RequestException as e:
+            print("Erro ao carregar o modelo:", e)
+            return False
+
+    def generate(self, prompt, format=None, kind="card"):
+        # Streams the completion and stops reading (which makes Ollama stop
+        # generating) as soon as the JSON value is complete or invalid.
+        # `kind` groups requests of similar size for the rate controller
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": self.keep_alive
+        }
+        if format:
+            payload["format"] = format
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_controller:
+                self.rate_controller.acquire()
+            start = time.perf_counter()
+            try:
+                text, cut_short = self._read_stream(payload)
+            except (requests.RequestException, ValueError, KeyError) as e:
+                # 4xx errors (e.g. unknown model) will not get better by retrying
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if self.rate_controller:
+                    overloaded = isinstance(e, (requests.Timeout, requests.ConnectionError)) or (status or 0) >= 500
+                    self.rate_controller.record(error=e if overloaded else None, kind=kind)
+                if attempt == self.max_retries or (status is not None and status < 500):
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self.backoff * (2 ** attempt))
+                continue
+
+            latency = time.perf_counter() - start
+            if self.rate_controller:
+                self.rate_controller.record(latency=latency, kind=kind)
+            with self._lock:
+                self.latencies.append(latency)
+                if cut_short:
+                    self.cut_short += 1
+            return text.strip()
+
+    def _read_stream(self, payload):
+        # Returns (text, cut_short). Once the JSON closes, the few remaining
+        # lines up to Ollama's final "done" are still read, so the response
+        # ends cleanly and its connection goes back to the pool. Only invalid
+        # or runaway output hangs up early
+        scanner = JsonStreamScanner()
+        parts = []
+        state = "open"
+        trailing = 0
+        done = False
+        with self.session.post(self.url, json=payload, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise ValueError(chunk["error"])
+                piece = chunk.get("response", "")
+                # Ollama ends the response right after the "done" line
+                done = bool(chunk.get("done"))
+                if state == "open":
+                    parts.append(piece)
+                    state = scanner.feed(piece)
+                    if state == "invalid":
+                        break
+                elif piece:
+                    trailing += 1
+                    if trailing > MAX_TRAILING_CHUNKS:
+                        break
+        return "".join(parts), not done
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            calls, retries, failures, cut_short = len(latencies), self.retries, self.failures, self.cut_short
+        return {
+            "calls": calls,
+            "retries": retries,
+            "failures": failures,
+            "cut_short": cut_short,
+            "avg_latency": sum(latencies) / calls if calls else 0.0,
+            "p95_latency": latencies[int(0.95 * (calls - 1))] if calls else 0.0
+        }
+
+class ResponseCache:
+    """
+    On-disk cache of raw model responses, keyed by a hash of (model, prompt),
+    with least-recently-used eviction once the cache exceeds max_bytes.
+    """
+    def __init__(self, cache_dir=CACHE_DIR, model=MODEL_NAME, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.model = model
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # key -> size in bytes, oldest access first (file mtime tracks access)
+        entries = []
+        for name in os.listdir(cache_dir) if os.path.isdir(cache_dir) else []:
+            if name.endswith(".txt"):
+                stat = os.stat(os.path.join(cache_dir, name))
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self._total = sum(self._entries.values())
+
+    def key(self, prompt):
+        return hashlib.sha256(f"{self.model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def get(self, prompt):
+        key = self.key(prompt)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                text = f.read()
+            os.utime(self._path(key))
+            return text
+        except OSError:
+            self.discard(prompt)
+            return None
+
+    def put(self, prompt, text):
+        key = self.key(prompt)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self._total += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total -= old_size
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    def discard(self, prompt):
+        key = self.key(prompt)
+        with self._lock:
+            self._total -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+rate_controller = RateController()
+ollama = OllamaClient(rate_controller=rate_controller)
+response_cache = ResponseCache() if USE_CACHE else None
+
+def ask_ai(prompt, format=None, kind="card"):
     try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": MODEL_NAME,
-                "prompt": prompt,
-                "stream": False
-            }
-        )
-        return response.json()["response"].strip()
+        return ollama.generate(prompt, format, kind)
     except Exception as e:
         print("Erro com o modelo:", e)
         return ""
 
+def lookup_cached(prompt):
+    # The parsed cached response to prompt, dropping it if it is unusable
+    if not response_cache:
+        return None
+    cached = response_cache.get(prompt)
+    if cached is None:
+        return None
+    parsed = safe_parse_json(cached)
+    if parsed and parsed.get("source"):
+        return parsed
+    response_cache.discard(prompt)
+    return None
+
+def ask_ai_cached(prompt, refresh=False, kind="card"):
+    # Returns the parsed card JSON, only caching responses that are usable.
+    # refresh skips a cached response, e.g. one that already led to a bad card
+    if response_cache and refresh:
+        response_cache.discard(prompt)
+    else:
+        parsed = lookup_cached(prompt)
+        if parsed:
+            return parsed
+
+    raw_output = ask_ai(prompt, CARD_SCHEMA, kind)
+    parsed = safe_parse_json(raw_output)
+    if parsed and parsed.get("source") and response_cache:
+        response_cache.put(prompt, raw_output)
+    return parsed
+
 def safe_parse_json(text):
     try:
         start = text.find('{')
@@ -81,18 +508,200 @@ def safe_parse_json(text):
         print(text)
         return None
 
+def safe_parse_json_array(text):
+    # Decodes every object in the response on its own, so one malformed
+    # element (or a broken array) does not lose the rest of the batch
+    decoder = json.JSONDecoder()
+    items = {}
+    pos = text.find('{')
+    while pos != -1:
+        try:
+            obj, end = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            pos = text.find('{', pos + 1)
+            continue
+        if isinstance(obj, dict) and isinstance(obj.get("word"), str):
+            items[obj["word"].strip()] = obj
+        pos = text.find('{', end)
+    return items
+
+# i-row kana before ます mapped to the u-row ending of the dictionary form
+GODAN_ENDINGS = {
+    "い": "う", "き": "く", "ぎ": "ぐ", "し": "す", "ち": "つ",
+    "に": "ぬ", "び": "ぶ", "み": "む", "り": "る"
+}
+E_ROW = set("えけげせぜてでねへべぺめれ")
+# きます may also be 着ます (きる), so it stays a guess
+IRREGULAR_VERBS = {"し": ["する"], "き": ["くる", "きる"], "来": ["来る"], "い": ["いる"]}
+NA_ADJECTIVES_ENDING_IN_I = {"きれい", "綺麗", "きらい", "嫌い", "ゆうめい", "有名"}
+# Set phrases that only exist in the polite form
+FIXED_EXPRESSIONS = {
+    "すみません", "いただきます", "ごちそうさまでした", "かしこまりました",
+    "お願いします", "おねがいします", "よろしくお願いします", "失礼します", "しつれいします"
+}
+POLITE_VERB_SUFFIXES = ("ませんでした", "ました", "ません", "ます")
+
+def is_kanji(char):
+    return "\u4e00" <= char <= "\u9fff"
+
+def to_dictionary_form(word):
+    """
+    Maps polite forms (〜ます/〜ました/〜ません, 〜です) to the dictionary form
+    the prompt asks for. Returns the candidates, best guess first; a single
+    candidate means the form is unambiguous.
+    """
+    if word in FIXED_EXPRESSIONS or "ございま" in word or " " in word:
+        return [word]
+
+    for suffix in POLITE_VERB_SUFFIXES:
+        stem = word[:-len(suffix)]
+        if word.endswith(suffix) and stem:
+            if stem in IRREGULAR_VERBS:
+                return list(IRREGULAR_VERBS[stem])
+            if stem.endswith("し") and len(stem) > 2 and all(is_kanji(c) for c in stem[:-1]):
+                # 勉強します → 勉強する, while 話します → 話す falls through below
+                return [stem[:-1] + "する", stem[:-1] + "す"]
+            last = stem[-1]
+            if last in E_ROW:
+                return [stem + "る"]
+            if last in GODAN_ENDINGS:
+                # 書きます → 書く, but also 起きます → 起きる
+                return [stem[:-1] + GODAN_ENDINGS[last], stem + "る"]
+            if is_kanji(last):
+                # Godan stems always end in kana: 寝ます → 寝る
+                return [stem + "る"]
+            return [word]
+
+    if word.endswith("です") and len(word) > 2:
+        stem = word[:-2]
+        # 高いです → 高い, きれいです → きれいだ
+        if stem.endswith("い") and stem not in NA_ADJECTIVES_ENDING_IN_I:
+            return [stem]
+        return [stem + "だ", stem]
+
+    return [word]
+
+def iter_words(path, limit, stats):
+    """
+    Streams normalized, de-duplicated words from the input file, stopping
+    after `limit` words. `stats` counts what was skipped along the way.
+
+    Polite forms are converted only when the dictionary form is unambiguous;
+    otherwise the word is kept as written (the prompt asks the model for the
+    dictionary form) and its guessed forms only serve to spot variants.
+    """
+    raw_seen = set()
+    emitted = set()
+    forms = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            word = unicodedata.normalize("NFKC", line).strip()
+            if not word:
+                stats["blank"] += 1
+                continue
+            if word.startswith("#"):
+                stats["comments"] += 1
+                continue
+            if word in raw_seen:
+                stats["duplicates"] += 1
+                continue
+            raw_seen.add(word)
+
+            candidates = to_dictionary_form(word)
+            if word in forms or any(candidate in forms for candidate in candidates):
+                stats["variants"] += 1
+                continue
+            if len(candidates) == 1 and candidates[0] != word:
+                stats["normalized"] += 1
+                word = candidates[0]
+
+            emitted.add(word)
+            forms.add(word)
+            forms.update(candidates)
+            yield word
+            if len(emitted) >= limit:
+                break
+
 def load_existing_deck():
-    if not os.path.exists(OUTPUT_FILE):
-        return {"deck_properties": {}, "cards": []}
-    
-    with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    if os.path.exists(OUTPUT_FILE):
+        with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
+            deck = json.load(f)
+    else:
+        deck = {"deck_properties": {}, "cards": []}
+
+    deck.setdefault("cards", [])
+    replay_journal(deck)
+    return deck
+
+def replay_journal(deck):
+    # Applies cards from an interrupted run that were never compacted
+    if not os.path.exists(JOURNAL_FILE):
+        return
+
+    index = build_card_index(deck)
+    replayed = 0
+    with open(JOURNAL_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                card = json.loads(line)
+            except json.JSONDecodeError:
+                # A killed run can leave a partially written last line
+                print("⚠️ Linha incompleta ignorada no journal")
+                continue
+            upsert_card(deck, index, card)
+            replayed += 1
+
+    if replayed:
+        print(f"♻️ {replayed} cartas recuperadas de {JOURNAL_FILE}")
+
+def open_journal():
+    # A killed run can leave a torn last line; terminate it so the next card
+    # starts on its own line instead of being glued to the fragment
+    with open(JOURNAL_FILE, "ab+") as f:
+        if f.seek(0, os.SEEK_END):
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    return open(JOURNAL_FILE, "a", encoding="utf-8")
 
-def word_card_lookup(word, deck):
+def append_to_journal(journal, card):
+    journal.write(json.dumps(card, ensure_ascii=False) + "\n")
+    journal.flush()
+
+def compact_deck(deck, journal):
+    # Write to a temp file and swap it in, so a crash never leaves a half-written deck
+    tmp_file = OUTPUT_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(deck, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, OUTPUT_FILE)
+
+    # Everything in the journal is now in the deck
+    journal.truncate(0)
+
+def build_card_index(deck):
+    # Maps target -> position in deck["cards"]. Duplicated cards in the file
+    # are dropped, keeping the last version (same as the old removal logic)
+    unique = {}
     for card in deck["cards"]:
-        if card.get("target") == word:
-            return card
-    return None
+        unique.pop(card.get("target"), None)
+        unique[card.get("target")] = card
+    deck["cards"] = list(unique.values())
+    return {target: i for i, target in enumerate(unique)}
+
+def word_card_lookup(word, deck, index):
+    pos = index.get(word)
+    return deck["cards"][pos] if pos is not None else None
+
+def upsert_card(deck, index, card):
+    pos = index.get(card["target"])
+    if pos is None:
+        index[card["target"]] = len(deck["cards"])
+        deck["cards"].append(card)
+    else:
+        deck["cards"][pos] = card
 
 def to_prompt_card_json(card):
     # Converts a card back to the same JSON format used in prompt (for verification)
@@ -105,27 +714,48 @@ def to_prompt_card_json(card):
         "romanization": card.get("extras", {}).get("romanization", "")
     }, ensure_ascii=False, indent=2)
 
-def verify_or_generate_card(word, existing_card=None):
+def build_prompt(word, existing_card=None):
     if existing_card:
-        prompt = VERIFY_PROMPT_TEMPLATE.format(
+        return VERIFY_PROMPT_TEMPLATE.format(
             word=word,
             target_lang=TARGET_LANGUAGE.capitalize(),
             existing_json=to_prompt_card_json(existing_card)
         )
-    else:
-        prompt = PROMPT_TEMPLATE.format(
-            word=word,
-            target_lang=TARGET_LANGUAGE.capitalize()
-        )
-    
-    raw_output = ask_ai(prompt)
-    parsed = safe_parse_json(raw_output)
+    return PROMPT_TEMPLATE.format(
+        word=word,
+        target_lang=TARGET_LANGUAGE.capitalize()
+    )
+
+def build_batch_prompt(words):
+    return BATCH_PROMPT_TEMPLATE.format(
+        word_list="\n".join(f"- 「{word}」" for word in words)
+    )
+
+def verify_or_generate_card(word, existing_card=None):
+    prompt = build_prompt(word, existing_card)
+    # A card failing the local checks may itself come from a cached response
+    refresh = bool(existing_card) and bool(find_card_problems(existing_card, REQUIRED_FIELDS))
+    parsed = ask_ai_cached(prompt, refresh=refresh, kind="verify" if existing_card else "card")
 
     if not parsed or not parsed.get("source"):
         print(f"❌ Falha para '{word}'")
         return None
 
-    return {
+    card = card_from_parsed(word, parsed, existing_card)
+    if existing_card:
+        card["extras"]["verified"] = card_fingerprint(card)
+    return card
+
+def card_fingerprint(card):
+    return hashlib.sha256(f"{card['target']}\0{to_prompt_card_json(card)}".encode("utf-8")).hexdigest()
+
+def is_model_verified(card):
+    # Set when the model returned this exact content for a verification
+    # prompt; editing the card invalidates it
+    return card.get("extras", {}).get("verified") == card_fingerprint(card)
+
+def card_from_parsed(word, parsed, existing_card=None):
+    card = {
         "source": parsed["source"],
         "target": word,
         "source_example": parsed["source_example"],
@@ -151,9 +781,65 @@ def verify_or_generate_card(word, existing_card=None):
         }
     }
 
+    return card
+
+def generate_card_task(word, existing_card=None):
+    # Runs inside the pool: a failure here must not stall the other words
+    try:
+        return verify_or_generate_card(word, existing_card)
+    except Exception as e:
+        print(f"❌ Erro inesperado para '{word}': {e}")
+        return None
+
+def verify_card_task(word, existing_card):
+    return [generate_card_task(word, existing_card)]
+
+def generate_batch_task(words):
+    # Asks for several new words in one request; any word missing from the
+    # response or with incomplete fields is retried on its own. Each card is
+    # cached under its single-word prompt, so a rerun finds it whatever
+    # batch the word lands in
+    cards = {}
+    for word in words:
+        parsed = lookup_cached(build_prompt(word))
+        if parsed:
+            cards[word] = card_from_parsed(word, parsed)
+    remaining = [word for word in words if word not in cards]
+
+    if len(remaining) == 1:
+        cards[remaining[0]] = generate_card_task(remaining[0])
+    elif remaining:
+        try:
+            items = safe_parse_json_array(ask_ai(build_batch_prompt(remaining), BATCH_SCHEMA, f"batch:{len(remaining)}"))
+        except Exception as e:
+            print(f"❌ Erro inesperado no lote {remaining}: {e}")
+            items = {}
+
+        for word in remaining:
+            parsed = items.get(word)
+            if parsed and all(str(parsed.get(field, "")).strip() for field in REQUIRED_FIELDS):
+                if response_cache:
+                    fields = {field: parsed[field] for field in REQUIRED_FIELDS}
+                    response_cache.put(build_prompt(word), json.dumps(fields, ensure_ascii=False))
+                cards[word] = card_from_parsed(word, parsed)
+            else:
+                print(f"↩️ '{word}' ausente ou incompleta no lote, tentando sozinha")
+                cards[word] = generate_card_task(word)
+    return [cards[word] for word in words]
+
+def merge_card_result(deck, index, journal, future):
+    merged = 0
+    for card in future.result():
+        if card:
+            # Replace old version in place if it exists
+            upsert_card(deck, index, card)
+            append_to_journal(journal, card)
+            merged += 1
+    return merged
+
 def main():
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        words = [line.strip() for line in f.readlines()[:MAX_WORDS]]
+    word_stats = {"blank": 0, "comments": 0, "duplicates": 0, "variants": 0, "normalized": 0}
+    words = iter_words(INPUT_FILE, MAX_WORDS, word_stats)
 
     deck = load_existing_deck()
 
@@ -168,26 +854,82 @@ def main():
             "target_language": TARGET_LANGUAGE
         }
 
-    # Initialize cards if not present
-    if "cards" not in deck:
-        deck["cards"] = []
+    index = build_card_index(deck)
+    merged = 0
+    locally_verified = 0
+    model_verified = 0
 
-    for i, word in enumerate(words):
-        existing_card = word_card_lookup(word, deck)
-        print(f"[{i+1}/{MAX_WORDS}] 🔍 Verificando ou criando: {word}")
+    ollama.preload()
 
-        card = verify_or_generate_card(word, existing_card)
-        if card:
-            # Remove old version if it exists
-            deck["cards"] = [c for c in deck["cards"] if c.get("target") != word]
-            deck["cards"].append(card)
-        
-            with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-                json.dump(deck, f, ensure_ascii=False, indent=2)
+    with open_journal() as journal:
+        def merge_next(pending):
+            nonlocal merged
+            previous = merged
+            merged += merge_card_result(deck, index, journal, pending.popleft())
+            if merged // COMPACT_EVERY > previous // COMPACT_EVERY:
+                compact_deck(deck, journal)
+
+        try:
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                # Bounded window of in-flight tasks; results are consumed in input
+                # order so the resulting deck is deterministic
+                pending = deque()
+                batch = []
+                for i, word in enumerate(words):
+                    existing_card = word_card_lookup(word, deck, index)
+                    if existing_card and not VERIFY_ALL_CARDS:
+                        problems = find_card_problems(existing_card, REQUIRED_FIELDS)
+                        if not problems:
+                            locally_verified += 1
+                            print(f"[{i+1}/{MAX_WORDS}] ✔️ Válida localmente: {word}")
+                            continue
+                        if is_model_verified(existing_card):
+                            # The checks can flag correct cards; the model already kept this one
+                            model_verified += 1
+                            print(f"[{i+1}/{MAX_WORDS}] ✔️ Já verificada pelo modelo: {word}")
+                            continue
+                        print(f"⚠️ '{word}': {'; '.join(problems)}")
+
+                    print(
+                        f"[{i+1}/{MAX_WORDS}] 🔍 Verificando ou criando: {word} "
+                        f"({rate_controller.rate:.2f} req/s, fila {len(pending)}, "
+                        f"em andamento {rate_controller.in_flight})"
+                    )
+                    if existing_card:
+                        pending.append(executor.submit(verify_card_task, word, existing_card))
+                    else:
+                        batch.append(word)
+                        if len(batch) >= BATCH_SIZE:
+                            pending.append(executor.submit(generate_batch_task, batch))
+                            batch = []
+
+                    if len(pending) >= MAX_WORKERS * 2:
+                        merge_next(pending)
 
-        time.sleep(1.5)
+                if batch:
+                    pending.append(executor.submit(generate_batch_task, batch))
+                while pending:
+                    merge_next(pending)
+        finally:
+            compact_deck(deck, journal)
 
-    print(f"\n✅ Deck salvo em: {OUTPUT_FILE}")
+    stats = ollama.stats()
+    print(
+        f"\n📊 {stats['calls']} chamadas, {stats['retries']} novas tentativas, "
+        f"{stats['failures']} falhas, {stats['cut_short']} interrompidas, latência média {stats['avg_latency']:.2f}s "
+        f"(p95 {stats['p95_latency']:.2f}s)"
+    )
+    saved_calls = word_stats["blank"] + word_stats["comments"] + word_stats["duplicates"] + word_stats["variants"]
+    print(
+        f"🧹 Lista de palavras: {word_stats['blank']} vazias, {word_stats['comments']} comentários, "
+        f"{word_stats['duplicates']} duplicadas, {word_stats['variants']} variantes, "
+        f"{word_stats['normalized']} convertidas para a forma de dicionário "
+        f"({saved_calls} chamadas ao modelo evitadas)"
+    )
+    print(f"✔️ {locally_verified} cartas validadas localmente e {model_verified} já verificadas pelo modelo, sem chamar o modelo")
+    if response_cache:
+        print(f"🗃️ Cache: {response_cache.hits} acertos, {response_cache.misses} faltas")
+    print(f"✅ Deck salvo em: {OUTPUT_FILE}")
 
 if __name__ == "__main__":
     main()
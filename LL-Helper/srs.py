@@ -0,0 +1,119 @@
+"""
+Review scheduling over the deck's srs_data, kept in columnar NumPy arrays.
+
+srs_data fields: balance (consecutive successful reviews), interval (days),
+ease (SM-2 easiness factor), lastreviewed and due (unix timestamps, seconds).
+"""
+import json
+import sys
+import time
+import numpy as np
+
+DAY = 86400
+MIN_EASE = 1.3
+DEFAULT_SRS = {"balance": 0, "interval": 0, "ease": 2.5, "lastreviewed": 0, "due": 0}
+
+
+class SrsSchedule:
+    """
+    Columnar view of a deck's srs_data. Build it once with from_deck, query
+    due cards and apply review grades in batches, then write back with to_deck.
+    """
+    def __init__(self, targets, balance, interval, ease, lastreviewed, due):
+        self.targets = targets
+        self.balance = balance
+        self.interval = interval
+        self.ease = ease
+        self.lastreviewed = lastreviewed
+        self.due = due
+
+    @classmethod
+    def from_deck(cls, deck):
+        cards = deck["cards"]
+        n = len(cards)
+        balance = np.empty(n, dtype=np.int32)
+        interval = np.empty(n, dtype=np.float64)
+        ease = np.empty(n, dtype=np.float64)
+        lastreviewed = np.empty(n, dtype=np.float64)
+        due = np.empty(n, dtype=np.float64)
+
+        for i, card in enumerate(cards):
+            srs = card.get("srs_data") or DEFAULT_SRS
+            balance[i] = srs.get("balance", 0)
+            interval[i] = srs.get("interval", 0)
+            ease[i] = srs.get("ease", DEFAULT_SRS["ease"])
+            lastreviewed[i] = srs.get("lastreviewed", 0)
+            due[i] = srs.get("due", 0)
+
+        return cls([card.get("target") for card in cards], balance, interval, ease, lastreviewed, due)
+
+    def __len__(self):
+        return len(self.targets)
+
+    def due_queue(self, now=None, limit=None):
+        """Indices of cards due at `now`, most overdue first."""
+        now = time.time() if now is None else now
+        due_idx = np.flatnonzero(self.due <= now)
+        if limit is not None and limit < len(due_idx):
+            # Only the `limit` most overdue cards need to be ordered
+            due_idx = due_idx[np.argpartition(self.due[due_idx], limit)[:limit]]
+        return due_idx[np.argsort(self.due[due_idx], kind="stable")]
+
+    def apply_reviews(self, indices, grades, now=None):
+        """
+        Applies SM-2 updates for a batch of reviews. `grades` are 0-5, where
+        anything below 3 is a lapse. Each card should appear once per batch.
+        """
+        now = time.time() if now is None else now
+        indices = np.asarray(indices, dtype=np.intp)
+        q = np.asarray(grades, dtype=np.float64)
+
+        ease = self.ease[indices] + 0.1 - (5 - q) * (0.08 + (5 - q) * 0.02)
+        ease = np.maximum(ease, MIN_EASE)
+
+        balance = self.balance[indices]
+        interval = np.where(balance == 0, 1.0, np.where(balance == 1, 6.0, np.round(self.interval[indices] * ease)))
+        passed = q >= 3
+        interval = np.where(passed, interval, 1.0)
+        balance = np.where(passed, balance + 1, 0)
+
+        self.ease[indices] = ease
+        self.interval[indices] = interval
+        self.balance[indices] = balance
+        self.lastreviewed[indices] = now
+        self.due[indices] = now + interval * DAY
+
+    def to_deck(self, deck):
+        """Writes the arrays back into each card's srs_data."""
+        columns = zip(
+            self.balance.tolist(), self.interval.tolist(), self.ease.tolist(),
+            self.lastreviewed.tolist(), self.due.tolist()
+        )
+        for card, (balance, interval, ease, lastreviewed, due) in zip(deck["cards"], columns):
+            card["srs_data"] = {
+                "balance": balance,
+                "interval": int(interval) if interval.is_integer() else interval,
+                "ease": round(ease, 4),
+                "lastreviewed": int(lastreviewed),
+                "due": int(due)
+            }
+        return deck
+
+
+def main():
+    deck_file = sys.argv[1] if len(sys.argv) > 1 else "japanese_deck.json"
+    with open(deck_file, "r", encoding="utf-8") as f:
+        deck = json.load(f)
+
+    schedule = SrsSchedule.from_deck(deck)
+    start = time.perf_counter()
+    queue = schedule.due_queue()
+    elapsed = (time.perf_counter() - start) * 1000
+
+    print(f"📅 {len(queue)}/{len(schedule)} cartas para revisar ({elapsed:.2f} ms)")
+    for i in queue[:20]:
+        print(f"  - {schedule.targets[i]}")
+
+
+if __name__ == "__main__":
+    main()
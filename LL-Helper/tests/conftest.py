@@ -0,0 +1,103 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CARD = {
+    "source": "cat",
+    "source_example": "There is a cat.",
+    "target_example": "ねこがいます。",
+    "word_furigana": "ねこ",
+    "sentence_furigana": "ねこがいます。",
+    "romanization": "neko"
+}
+
+
+def default_response(prompt):
+    # CARD for a single-word prompt, one CARD per word for a batch prompt
+    if not prompt:
+        return ""
+    words = re.findall(r"^- 「(.*)」$", prompt, re.MULTILINE)
+    if words:
+        return json.dumps([{"word": word, **CARD} for word in words], ensure_ascii=False)
+    return json.dumps(CARD, ensure_ascii=False)
+
+
+class StandInOllamaHandler(BaseHTTPRequestHandler):
+    # Streams like Ollama: chunked NDJSON over a keep-alive connection, the
+    # generated text spread over several lines and a final empty "done" line
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests.append(body)
+            server.client_ports.add(self.client_address[1])
+            step = server.script.pop(0) if server.script else {}
+
+        time.sleep(step.get("delay", 0))
+        status = step.get("status", 200)
+        if status != 200:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            payload = json.dumps({"error": f"status {status}"}).encode("utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        text = step.get("text", default_response(body.get("prompt")))
+        lines = [{"response": text[i:i + 20], "done": False} for i in range(0, len(text), 20)]
+        lines.append({"response": "", "done": True, "done_reason": "stop"})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for line in lines:
+                data = (json.dumps(line) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class StandInOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # The client hangs up on streams it stops reading early
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+@pytest.fixture
+def stand_in_ollama():
+    """
+    Local stand-in for Ollama's /api/generate. Append dicts to `script` to
+    control the next responses: {"status": 500}, {"delay": 1.0}, {"text": "..."}.
+    """
+    server = StandInOllamaServer(("127.0.0.1", 0), StandInOllamaHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.client_ports = set()
+    server.script = []
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,41 @@
+from card_validator import find_card_problems, kana_to_romaji
+from main import REQUIRED_FIELDS
+
+
+def card(**fields):
+    extras = {key: fields.pop(key) for key in ("word_furigana", "sentence_furigana", "romanization") if key in fields}
+    return {
+        "target": fields.pop("target", "猫"),
+        "source": "cat",
+        "source_example": "There is a cat.",
+        "target_example": "猫がいます。",
+        **fields,
+        "extras": {"word_furigana": "ねこ", "sentence_furigana": "ねこがいます。", "romanization": "neko", **extras}
+    }
+
+
+def test_kana_to_romaji():
+    assert kana_to_romaji("がっこう") == "gakkou"
+    assert kana_to_romaji("きょう") == "kyou"
+    assert kana_to_romaji("らーめん") == "raamen"
+
+
+def test_long_vowel_after_unmapped_kana():
+    # ゖ has no romaji; the long vowel mark after it must not crash
+    assert kana_to_romaji("ゖー") == ""
+    assert find_card_problems(card(word_furigana="ゖー"), REQUIRED_FIELDS)
+
+
+def test_valid_card_has_no_problems():
+    assert find_card_problems(card(), REQUIRED_FIELDS) == []
+
+
+def test_romanization_mismatch_is_reported():
+    assert find_card_problems(card(romanization="tabru"), REQUIRED_FIELDS) == ["romanization não corresponde a word_furigana"]
+
+
+def test_suru_verb_example_in_polite_form():
+    suru = card(target="勉強する", target_example="毎日日本語を勉強します。",
+                word_furigana="べんきょうする", sentence_furigana="まいにちにほんごをべんきょうします。",
+                romanization="benkyou suru")
+    assert find_card_problems(suru, REQUIRED_FIELDS) == []
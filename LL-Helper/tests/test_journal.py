@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def card(target):
+    return {"target": target, "source": target}
+
+
+def targets(deck):
+    return [c["target"] for c in deck["cards"]]
+
+
+def test_cards_appended_after_a_torn_line_survive_the_next_restart(work_dir):
+    # A run killed mid-write: one complete card and a fragment
+    with open(main.JOURNAL_FILE, "w", encoding="utf-8") as f:
+        f.write(json.dumps(card("a")) + "\n" + '{"target": "b", "sou')
+
+    assert targets(main.load_existing_deck()) == ["a"]
+    # Second run appends and is killed again before compaction
+    with main.open_journal() as journal:
+        main.append_to_journal(journal, card("new"))
+
+    assert targets(main.load_existing_deck()) == ["a", "new"]
+
+
+def test_compaction_moves_journal_into_deck(work_dir):
+    deck = main.load_existing_deck()
+    index = main.build_card_index(deck)
+    with main.open_journal() as journal:
+        for target in ("a", "b", "a"):
+            main.upsert_card(deck, index, card(target))
+            main.append_to_journal(journal, card(target))
+        main.compact_deck(deck, journal)
+
+    assert (work_dir / main.JOURNAL_FILE).read_text(encoding="utf-8") == ""
+    assert targets(main.load_existing_deck()) == ["a", "b"]
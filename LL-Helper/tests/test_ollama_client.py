@@ -0,0 +1,134 @@
+import json
+import time
+
+import pytest
+import requests
+
+from main import OllamaClient, safe_parse_json
+from conftest import CARD
+
+
+def make_client(server, **kwargs):
+    kwargs.setdefault("backoff", 0.05)
+    return OllamaClient(base_url=server.url, model="stand-in", **kwargs)
+
+
+def test_generate_returns_streamed_text(stand_in_ollama):
+    client = make_client(stand_in_ollama)
+    assert json.loads(client.generate("「猫」")) == CARD
+    assert client.stats()["calls"] == 1
+
+
+def test_payload_carries_model_stream_and_keep_alive(stand_in_ollama):
+    client = make_client(stand_in_ollama, keep_alive="5m")
+    client.generate("「猫」", format={"type": "object"})
+
+    payload = stand_in_ollama.requests[0]
+    assert payload["model"] == "stand-in"
+    assert payload["prompt"] == "「猫」"
+    assert payload["stream"] is True
+    assert payload["keep_alive"] == "5m"
+    assert payload["format"] == {"type": "object"}
+
+
+def test_retries_5xx_with_backoff(stand_in_ollama):
+    stand_in_ollama.script += [{"status": 500}, {"status": 503}]
+    client = make_client(stand_in_ollama, max_retries=3, backoff=0.1)
+
+    start = time.perf_counter()
+    assert json.loads(client.generate("「猫」")) == CARD
+    elapsed = time.perf_counter() - start
+
+    assert len(stand_in_ollama.requests) == 3
+    assert client.stats()["retries"] == 2
+    assert client.stats()["failures"] == 0
+    # 0.1s then 0.2s between attempts
+    assert elapsed >= 0.3
+
+
+def test_gives_up_after_max_retries(stand_in_ollama):
+    stand_in_ollama.script += [{"status": 500}] * 3
+    client = make_client(stand_in_ollama, max_retries=2, backoff=0.01)
+
+    with pytest.raises(requests.HTTPError):
+        client.generate("「猫」")
+    assert len(stand_in_ollama.requests) == 3
+    assert client.stats()["failures"] == 1
+
+
+def test_does_not_retry_4xx(stand_in_ollama):
+    stand_in_ollama.script.append({"status": 404})
+    client = make_client(stand_in_ollama, max_retries=3)
+
+    with pytest.raises(requests.HTTPError) as error:
+        client.generate("「猫」")
+    assert error.value.response.status_code == 404
+    assert len(stand_in_ollama.requests) == 1
+    assert client.stats()["retries"] == 0
+    assert client.stats()["failures"] == 1
+
+
+def test_read_timeout_is_retried_then_raised(stand_in_ollama):
+    stand_in_ollama.script += [{"delay": 1.0}, {"delay": 1.0}]
+    client = make_client(stand_in_ollama, timeout=(1, 0.2), max_retries=1, backoff=0.01)
+
+    start = time.perf_counter()
+    with pytest.raises(requests.Timeout):
+        client.generate("「猫」")
+    assert time.perf_counter() - start < 1.5
+    assert len(stand_in_ollama.requests) == 2
+
+
+def test_timeout_then_success(stand_in_ollama):
+    stand_in_ollama.script.append({"delay": 1.0})
+    client = make_client(stand_in_ollama, timeout=(1, 0.2), max_retries=1, backoff=0.01)
+
+    assert json.loads(client.generate("「猫」")) == CARD
+    assert client.stats()["retries"] == 1
+
+
+def test_preload_sends_empty_prompt_with_keep_alive(stand_in_ollama):
+    client = make_client(stand_in_ollama, keep_alive="1h")
+
+    assert client.preload() is True
+    assert stand_in_ollama.requests == [{"model": "stand-in", "keep_alive": "1h"}]
+
+
+def test_preload_reports_failure(stand_in_ollama):
+    stand_in_ollama.script.append({"status": 500})
+    client = make_client(stand_in_ollama)
+
+    assert client.preload() is False
+
+
+def test_finished_streams_reuse_one_connection(stand_in_ollama):
+    client = make_client(stand_in_ollama)
+    for _ in range(5):
+        client.generate("「猫」")
+
+    assert client.stats()["cut_short"] == 0
+    assert len(stand_in_ollama.client_ports) == 1
+
+
+def test_closing_fence_after_the_json_is_not_cut_short(stand_in_ollama):
+    card = json.dumps(CARD, ensure_ascii=False)
+    stand_in_ollama.script.append({"text": "```json\n" + card + "\n```"})
+    client = make_client(stand_in_ollama)
+
+    assert safe_parse_json(client.generate("「猫」")) == CARD
+    assert client.stats()["cut_short"] == 0
+
+
+def test_runaway_and_invalid_streams_are_cut_short(stand_in_ollama):
+    card = json.dumps(CARD, ensure_ascii=False)
+    stand_in_ollama.script += [
+        {"text": card + "\n\nNote: " + "this card was generated carefully. " * 100},
+        {"text": "{\"source\": [}" + " " * 2000}
+    ]
+    client = make_client(stand_in_ollama)
+
+    runaway = client.generate("「猫」")
+    assert safe_parse_json(runaway) == CARD
+    assert "generated carefully" not in runaway
+    client.generate("「猫」")
+    assert client.stats()["cut_short"] == 2
@@ -0,0 +1,42 @@
+import random
+
+import requests
+
+from main import RateController
+
+
+def run(controller, latency, kind="card"):
+    # acquire() would sleep out the delay; only the feedback matters here
+    controller.in_flight += 1
+    controller.record(latency=latency, kind=kind)
+
+
+def test_mixed_request_kinds_are_not_mistaken_for_slowdowns():
+    controller = RateController(initial_delay=0.0)
+    rng = random.Random(0)
+    for _ in range(60):
+        if rng.random() < 0.5:
+            run(controller, rng.gauss(5.0, 0.3), "verify")
+        else:
+            run(controller, rng.gauss(18.0, 1.0), "batch:5")
+    assert controller.delay == controller.min_delay
+
+
+def test_slowdown_of_one_kind_backs_off():
+    controller = RateController(initial_delay=0.0)
+    for _ in range(10):
+        run(controller, 5.0)
+    for _ in range(10):
+        run(controller, 15.0)
+    assert controller.delay > controller.min_delay
+
+
+def test_errors_back_off_and_client_errors_are_ignored():
+    controller = RateController(initial_delay=0.0)
+    controller.acquire()
+    controller.record()
+    assert controller.latency == {} and controller.in_flight == 0
+
+    controller.acquire()
+    controller.record(error=requests.Timeout())
+    assert controller.delay == 2.0
@@ -0,0 +1,66 @@
+import pytest
+
+import main
+from conftest import CARD
+
+
+@pytest.fixture
+def app(stand_in_ollama, tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "rate_controller", None)
+    monkeypatch.setattr(main, "ollama", main.OllamaClient(base_url=stand_in_ollama.url, backoff=0.01))
+    monkeypatch.setattr(main, "response_cache", main.ResponseCache(cache_dir=str(tmp_path / "cache")))
+    return stand_in_ollama
+
+
+def test_only_model_responses_are_cached(app):
+    card = main.verify_or_generate_card("猫")
+
+    assert card["source"] == CARD["source"]
+    assert list(main.response_cache._entries) == [main.response_cache.key(main.build_prompt("猫"))]
+    # Verifying the new card is a real model call, not an echo of the card
+    assert main.response_cache.get(main.build_prompt("猫", card)) is None
+
+
+def test_repeated_prompt_is_served_from_cache(app):
+    main.verify_or_generate_card("猫")
+    main.verify_or_generate_card("猫")
+
+    assert len(app.requests) == 1
+    assert main.response_cache.hits == 1
+
+
+def test_card_failing_local_checks_bypasses_cached_response(app):
+    broken = main.card_from_parsed("猫", dict(CARD, romanization="tabru"))
+    prompt = main.build_prompt("猫", broken)
+    # A response cached earlier that reproduces the broken card
+    main.response_cache.put(prompt, main.to_prompt_card_json(broken))
+
+    fixed = main.verify_or_generate_card("猫", broken)
+
+    assert len(app.requests) == 1
+    assert fixed["extras"]["romanization"] == "neko"
+
+
+def test_verified_card_is_flagged_until_edited(app):
+    # Fails the local checks, but the model returns it unchanged
+    flagged = main.card_from_parsed("猫", dict(CARD, target_example="ネコがいます。"))
+    app.script.append({"text": main.to_prompt_card_json(flagged)})
+
+    verified = main.verify_or_generate_card("猫", flagged)
+
+    assert main.is_model_verified(verified)
+    assert not main.is_model_verified(flagged)
+    verified["source"] = "dog"
+    assert not main.is_model_verified(verified)
+
+
+def test_batch_items_are_cached_per_word(app):
+    cards = main.generate_batch_task(["猫", "犬", "鳥"])
+    assert [card["target"] for card in cards] == ["猫", "犬", "鳥"]
+    assert len(app.requests) == 1
+
+    # A rerun batches the words differently; only the new word is asked for
+    cards = main.generate_batch_task(["犬", "猫", "魚"])
+    assert [card["target"] for card in cards] == ["犬", "猫", "魚"]
+    assert len(app.requests) == 2
+    assert app.requests[-1]["prompt"] == main.build_prompt("魚")
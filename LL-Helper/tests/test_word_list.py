@@ -0,0 +1,32 @@
+import pytest
+
+from main import iter_words
+
+
+def read_words(tmp_path, lines, limit=100):
+    path = tmp_path / "words.txt"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    stats = {"blank": 0, "comments": 0, "duplicates": 0, "variants": 0, "normalized": 0}
+    return list(iter_words(str(path), limit, stats)), stats
+
+
+@pytest.mark.parametrize("word", ["起きます", "できます", "学生です", "勉強します", "きます"])
+def test_ambiguous_polite_forms_are_kept_as_written(tmp_path, word):
+    words, stats = read_words(tmp_path, [word])
+    assert words == [word]
+    assert stats["normalized"] == 0
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("食べます", "食べる"), ("寝ました", "寝る"), ("します", "する"), ("高いです", "高い")
+])
+def test_unambiguous_polite_forms_are_converted(tmp_path, word, expected):
+    words, stats = read_words(tmp_path, [word])
+    assert words == [expected]
+    assert stats["normalized"] == 1
+
+
+def test_guessed_forms_still_catch_variants(tmp_path):
+    words, stats = read_words(tmp_path, ["起きます", "起きる", "食べる", "食べました", "# note", "", "起きます"])
+    assert words == ["起きます", "食べる"]
+    assert stats == {"blank": 1, "comments": 1, "duplicates": 1, "variants": 2, "normalized": 0}
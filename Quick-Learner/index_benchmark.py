@@ -0,0 +1,88 @@
+"""
+Recall versus memory/latency benchmark for the FAISS index types in
+integrations/helpers/index_types.py.
+
+Uses the vectors of a saved store (./storage/faiss/<hash>) or synthetic
+clustered vectors, builds every index type over them and reports build time,
+index size, query latency and recall@k against the exact flat index.
+
+    python index_benchmark.py --count 100000 --dim 1024
+    python index_benchmark.py --store ./storage/faiss/<hash>
+"""
+import argparse
+import os
+import time
+import faiss
+import numpy as np
+
+from integrations.helpers.index_types import INDEX_TYPES, build_index, index_vectors
+
+
+def synthetic_vectors(count, dim, clusters, seed):
+    # Clustered data looks more like real embeddings than uniform noise
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, size=count)]
+    vectors += 0.5 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors
+
+
+def store_vectors(store_path):
+    return index_vectors(faiss.read_index(os.path.join(store_path, "index.faiss")))
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth))
+    return hits / truth.size
+
+
+def run(vectors, queries, k, types):
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    results = []
+    for index_type in types:
+        start = time.perf_counter()
+        index = build_index(index_type, vectors)
+        build_time = time.perf_counter() - start
+
+        # One query at a time, like the chat does
+        start = time.perf_counter()
+        found = np.vstack([index.search(query[None, :], k)[1] for query in queries])
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        size = len(faiss.serialize_index(index))
+        results.append((index_type, build_time, size, latency_ms, recall_at_k(found, truth)))
+    return results
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", help="folder with an index.faiss to take vectors from")
+    parser.add_argument("--count", type=int, default=100_000, help="synthetic vectors")
+    parser.add_argument("--dim", type=int, default=1024, help="synthetic dimension (mxbai-embed-large is 1024)")
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = store_vectors(args.store) if args.store else synthetic_vectors(args.count, args.dim, args.clusters, args.seed)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+
+    print(f"{len(vectors)} vetores de dimensão {vectors.shape[1]}, {len(queries)} consultas, k={args.k}\n")
+    print(f"{'tipo':<8}{'build (s)':>11}{'tamanho (MB)':>14}{'bytes/vetor':>13}{'ms/consulta':>13}{'recall@k':>10}")
+    for index_type, build_time, size, latency_ms, recall in run(vectors, queries, args.k, args.types):
+        print(
+            f"{index_type:<8}{build_time:>11.2f}{size / 2**20:>14.1f}{size / len(vectors):>13.0f}"
+            f"{latency_ms:>13.3f}{recall:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main_benchmark()
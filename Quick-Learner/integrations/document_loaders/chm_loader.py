@@ -1,28 +1,24 @@
 #chm_loader.py
 import os
-import hashlib
 import subprocess
 import tempfile
 import shutil
-import time
 from datetime import datetime
 from langchain_core.documents import Document
-from langchain_community.vectorstores import FAISS
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_community.vectorstores.faiss import FAISS as LC_FAISS
-from langchain_community.vectorstores.utils import DistanceStrategy
 from ..model_loaders.load_model import load_embedding_model, load_assistant_model
 from ..helpers.chat_history import FileChatMessageHistory
+from ..helpers.context import ContextAssembler
+from ..helpers.answer_cache import doc_set_key, get_answer_cache, replay
+from ..helpers.compression import compress_documents
+from ..helpers.fingerprint import get_file_hash
+from ..helpers.chunking import html_to_text, chunk_documents
+from ..helpers.ingestion import build_vector_store_with_progress
+from ..helpers.index_types import apply_index_type, load_index_type, save_index_type
+from ..helpers.disk_store import close_store, store_exists, load_store, save_store
 
 ASSISTANT_MODEL = "codellama:13b"  # codellama:7b or codellama:13b or codellama:34b (if possible)
 EMBEDDING_MODEL = "all-minilm"  # nomic-embed-text | mxbai-embed-large | all-minilm | gte-Qwen2-7B-instruct
-
-def get_file_hash(file_path):
-    with open(file_path, "rb") as f:
-        return hashlib.md5(f.read()).hexdigest()
-    
-def vectorstore_exists(path):
-    return os.path.exists(os.path.join(path, "index.faiss")) and os.path.exists(os.path.join(path, "index.pkl"))
+INDEX_TYPE = "auto"  # auto | flat | hnsw | ivfpq | sq8
 
 def extract_chm_with_7z(chm_path):
     temp_dir = tempfile.mkdtemp()
@@ -38,153 +34,127 @@ def extract_chm_with_7z(chm_path):
         shutil.rmtree(temp_dir)
         raise RuntimeError(f"Failed to extract CHM: {e}")
 
-def load_chm(chm_path, progress_callback=None):
-    extracted_dir = extract_chm_with_7z(chm_path)
-
+def find_html_files(extracted_dir):
     html_files = []
     for root, _, files in os.walk(extracted_dir):
         for file in files:
             if file.endswith(".html") or file.endswith(".htm"):
                 html_files.append(os.path.join(root, file))
+    return html_files
 
-    documents = []
-    total = len(html_files)
-
-    for i, filepath in enumerate(html_files):
-        try:
-            with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                content = f.read()
-                documents.append(Document(page_content=content, metadata={"source": filepath}))
-        except Exception:
-            continue
-
-        if progress_callback:
-            pct = 0.05 + 0.25 * (i / total)  # 5% até 30% da barra de progresso
-            progress_callback(pct, f"Reading file {i+1}/{total}")
-
-    return documents
-
-def build_vector_store_with_progress(docs, embed_func, progress_callback=None):
-    docs_with_embeddings = []
-    total = len(docs)
-
-    print(f"Iniciando embedding de {total} documentos...")
-
-    texts = [doc.page_content for doc in docs]
-    metadatas = [doc.metadata for doc in docs]
-    batch_size = 128 # pode ajustar conforme o modelo usado
-
-    '''
-    # Se o modelo de embedding for muito pesado, use um batch size menor
-    # Se o modelo de embedding for leve, use um batch size maior
-    mxbai-embed-large → use 16–32
-    nomic-embed-text → 32–64
-    gte-Qwen2-7B-instruct → pode exigir batch size <= 8, especialmente se for rodado localmente com pouca RAM/VRAM.
-    '''
-
-    for start in range(0, total, batch_size):
-        end = min(start + batch_size, total)
-        batch_texts = texts[start:end]
-        batch_embeddings = embed_func.embed_documents(batch_texts)
-
-        for i, emb in enumerate(batch_embeddings):
-            idx = start + i
-            docs_with_embeddings.append((docs[idx], emb))
-
-            if progress_callback:
-                pct = 0.3 + 0.6 * (idx / total)
-                progress_callback(pct, f"Embedding document {idx+1}/{total}")
-
-    print("Todos os embeddings foram gerados.")
-
-    if not docs_with_embeddings:
-        raise ValueError("Nenhum embedding foi gerado.")
-
-    text_embeddings = [(doc.page_content, emb) for doc, emb in docs_with_embeddings]
-    embeddings = [emb for _, emb in text_embeddings]
-    
-    print("Iniciando criação da vector store (FAISS.from_texts)...")
-    start_time = time.time()
-    
+def load_chm_page(filepath, extracted_dir):
+    """Read one extracted HTML page and return its text chunks."""
     try:
-        # Create the FAISS index directly with texts and embeddings
-        vectorstore = FAISS.from_embeddings(
-            text_embeddings=text_embeddings,
-            embedding=embed_func,
-            metadatas=metadatas,
-            distance_strategy=DistanceStrategy.COSINE,
-        )
-    except Exception as e:
-        print(f"Erro ao criar vector store: {e}")
-        raise
-
-    end_time = time.time()
-    print(f"Vector store criada com sucesso em {end_time - start_time:.2f} segundos.")
+        with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
+            title, content = html_to_text(f.read())
+    except Exception:
+        return []
 
-    return vectorstore
+    if not content:
+        return []
+    # Keep the path inside the CHM, not the temporary extraction dir
+    source = os.path.relpath(filepath, extracted_dir)
+    return chunk_documents([Document(page_content=content, metadata={"source": source, "title": title})], EMBEDDING_MODEL)
 
 class ChatCHM:
-    def __init__(self):
+    def __init__(self, index_type: str = INDEX_TYPE):
         self.vector_store = None
+        self.index_type = index_type
         self.chat_history = None
+        self.context: ContextAssembler = None
         self.llm = load_assistant_model(ASSISTANT_MODEL) # codellama:7b or codellama:13b or codellama:34b (if possible) 
         self.embed = load_embedding_model(EMBEDDING_MODEL) # mxbai-embed-large | nomic-embed-text | all-minilm (fast debugging) | gte-Qwen2-7B-instruct (top model)
         self.last_file_hash = None 
+        self.answer_cache = get_answer_cache()
+        self.last_context_stats = None  # chunk/token counts of the last question's context
 
     def ingest(self, file_path, progress_callback=None):
         file_hash = get_file_hash(file_path)
         print(f"File hash: {file_hash}")
+        self.last_file_hash = file_hash
         vectorstore_path = f"./storage/faiss/{file_hash}"
+        close_store(self.vector_store)
+        self.vector_store = None
 
-        if vectorstore_exists(vectorstore_path):
-            self.vector_store = FAISS.load_local(vectorstore_path, self.embed, allow_dangerous_deserialization=True)
+        if store_exists(vectorstore_path):
+            # A saved store keeps the index type it was built with
+            self.vector_store = load_store(vectorstore_path, self.embed)
+            print(f"Índice {load_index_type(vectorstore_path)} carregado.")
             if progress_callback:
                 progress_callback(1.0, "Ingestion complete!")
         else:
-            pages = load_chm(file_path, progress_callback)
+            if progress_callback:
+                progress_callback(0.02, "Extracting CHM...")
+
+            extracted_dir = extract_chm_with_7z(file_path)
+            try:
+                vector_store = build_vector_store_with_progress(
+                    find_html_files(extracted_dir),
+                    lambda filepath: load_chm_page(filepath, extracted_dir),
+                    self.embed,
+                    progress_callback
+                )
+            finally:
+                shutil.rmtree(extracted_dir, ignore_errors=True)
 
             if progress_callback:
-                progress_callback(0.3, "Generating embeddings...")
+                progress_callback(0.97, "Building index...")
+            index_type = apply_index_type(vector_store, self.index_type)
 
-            self.vector_store = build_vector_store_with_progress(pages, self.embed, progress_callback)
             os.makedirs(vectorstore_path, exist_ok=True)
             try:
                 os.makedirs(vectorstore_path, exist_ok=True)
-                self.vector_store.save_local(vectorstore_path)
+                save_store(vector_store, vectorstore_path)
+                save_index_type(vectorstore_path, index_type)
                 print("FAISS salvo com sucesso.")
             except Exception as e:
                 print(f"Erro ao salvar FAISS: {e}")
                 raise
+            # Reopen from disk so the chunk texts don't stay in memory
+            self.vector_store = load_store(vectorstore_path, self.embed)
 
             if progress_callback:
                 progress_callback(1.0, "Ingestion complete!")
 
         session_id = f"session_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
-        self.chat_history = FileChatMessageHistory("./storage/chat_history.json", session_id)
+        self.chat_history = FileChatMessageHistory("./storage/chat_history", session_id)
+        if self.context:
+            self.context.close()
+        self.context = ContextAssembler(self.llm, self.embed, self.chat_history)
 
     def ask(self, question: str):
         if not self.vector_store or not self.chat_history:
             return "No document loaded. Please upload a CHM file first."
 
-        docs = self.vector_store.similarity_search(question, k=2)
+        query_embedding = self.embed.embed_query(question)
+
+        # Same question over the same manual: replay the stored answer
+        doc_set = doc_set_key([self.last_file_hash], ASSISTANT_MODEL, EMBEDDING_MODEL)
+        cached_answer = self.answer_cache.lookup(doc_set, question, query_embedding)
+        if cached_answer is not None:
+            yield from replay(cached_answer)
+            self.context.record_turn(question, cached_answer)
+            return
+
+        # Relevant but mutually different pages, then cleaned up and trimmed to the question
+        docs = self.vector_store.max_marginal_relevance_search_by_vector(query_embedding, k=2, fetch_k=10, lambda_mult=0.6)
+        docs, self.last_context_stats = compress_documents(question, docs)
+
+        system_prompt = (
+            "You are a trained model used as an assistant for GENERAL question-answering tasks. "
+            "You can answer ANY question based on your own knowledge. "
+            "ALWAYS answer in the same language as the question. "
+            "Give a detailed answer, and if the question is not clear, ask for clarification. "
+            "You can use the following pieces of context to answer the question if relevant. "
+            "If the question is unrelated to the context, answer based on your knowledge. "
+            "Always remember you can answer any question because you are a capable assistant. "
+        )
 
-        history_text = "\n".join([
-            f"{msg.type.upper()}: {msg.content}"
-            for msg in self.chat_history.get_messages()
-        ])
-        
-        context = "\n\n".join([doc.page_content for doc in docs]) + "\n\nChat History:\n" + history_text
+        docs_text, history_text = self.context.assemble(question, query_embedding, docs, system_prompt=system_prompt)
+        context = docs_text + "\n\nChat History:\n" + history_text
 
         messages = [
-            {"role": "system", "content": (
-                "You are a trained model used as an assistant for GENERAL question-answering tasks. "
-                "You can answer ANY question based on your own knowledge. "
-                "ALWAYS answer in the same language as the question. "
-                "Give a detailed answer, and if the question is not clear, ask for clarification. "
-                "You can use the following pieces of context to answer the question if relevant. "
-                "If the question is unrelated to the context, answer based on your knowledge. "
-                "Always remember you can answer any question because you are a capable assistant. "
-            )},
+            {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}"}
         ]
 
@@ -196,11 +166,19 @@ class ChatCHM:
                 full_response += content_str
                 yield content_str
 
-        self.chat_history.add_message(HumanMessage(content=question))
-        self.chat_history.add_message(SystemMessage(content=full_response))
+        self.context.record_turn(question, full_response)
+        self.answer_cache.store(doc_set, question, query_embedding, full_response)
+
+    def forget_cached_answers(self):
+        """Drop the cached answers for the loaded CHM."""
+        self.answer_cache.invalidate(doc_set_key([self.last_file_hash], ASSISTANT_MODEL, EMBEDDING_MODEL))
 
     def clear(self):
+        close_store(self.vector_store)
         self.vector_store = None
         self.chat_history = None
+        if self.context:
+            self.context.close()
+        self.context = None
 
 
@@ -1,96 +1,132 @@
 # pdf_loader.py
 import os
-import hashlib
-import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from typing import List, Dict
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.vectorstores import FAISS
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.documents import Document
 from langchain_community.vectorstores.utils import DistanceStrategy
 from ..model_loaders.load_model import load_embedding_model, load_assistant_model
 from ..helpers.chat_history import FileChatMessageHistory
+from ..helpers.context import ContextAssembler
+from ..helpers.answer_cache import doc_set_key, get_answer_cache, replay
+from ..helpers.compression import compress_documents
+from ..helpers.fingerprint import get_file_hash
+from ..helpers.chunking import chunk_documents
+from ..helpers.ingestion import build_vector_store_with_progress
+from ..helpers.index_types import apply_index_type, index_type_of, index_vectors, save_index_type
+from ..helpers.disk_store import MultiDocstore, close_store, store_exists, load_store, owned_index, save_store
 
 ASSISTANT_MODEL = "gemma3:4b"  # gemma3:1b/gemma3:4b/gemma3:12b | codellama:7b/codellama:13b
 EMBEDDING_MODEL = "mxbai-embed-large"  # nomic-embed-text | mxbai-embed-large | all-minilm | gte-Qwen2-7B-instruct
-
-def get_file_hash(file_path):
-    with open(file_path, "rb") as f:
-        return hashlib.md5(f.read()).hexdigest()
-
-def vectorstore_exists(path):
-    return os.path.exists(os.path.join(path, "index.faiss")) and os.path.exists(os.path.join(path, "index.pkl"))
-
-def load_pdf(file_path: str):
+MAX_PARSE_WORKERS = os.cpu_count() or 1  # processes parsing PDFs in parallel
+TOP_K = 4  # chunks retrieved per question, across all loaded documents
+FILTER_FETCH_K = 200  # candidates scanned before applying a per-document filter
+MMR_FETCH_K = 20  # candidates MMR picks the TOP_K most relevant yet diverse chunks from
+MMR_LAMBDA = 0.6  # 1 = relevance only, 0 = diversity only
+INDEX_TYPE = "auto"  # auto | flat | hnsw | ivfpq | sq8, for the merged session index
+
+def load_pdf(file_path: str, file_hash: str = None):
     """Load a single PDF file and return documents with source metadata."""
+    file_hash = file_hash or get_file_hash(file_path)
     loader = PyPDFLoader(file_path)
     docs = list(loader.lazy_load())
     for doc in docs:
         doc.metadata["source"] = os.path.basename(file_path)
-        doc.metadata["file_hash"] = get_file_hash(file_path)
+        doc.metadata["file_hash"] = file_hash
     return docs
 
-def build_vector_store_with_progress(docs, embed_func, progress_callback=None) -> FAISS:
-    docs_with_embeddings = []
-    total = len(docs)
-
-    print(f"Iniciando embedding de {total} documentos...")
-
-    texts = [doc.page_content for doc in docs]
-    metadatas = [doc.metadata for doc in docs]
-    batch_size = 32  # pode ajustar conforme o modelo usado
-
-    for start in range(0, total, batch_size):
-        end = min(start + batch_size, total)
-        batch_texts = texts[start:end]
-        batch_embeddings = embed_func.embed_documents(batch_texts)
-
-        for i, emb in enumerate(batch_embeddings):
-            idx = start + i
-            docs_with_embeddings.append((docs[idx], emb))
-
-            if progress_callback:
-                pct = 0.3 + 0.6 * (idx / total)
-                progress_callback(pct, f"Embedding document {idx+1}/{total}")
-
-    print("Todos os embeddings foram gerados.")
-
-    if not docs_with_embeddings:
-        raise ValueError("Nenhum embedding foi gerado.")
-
-    text_embeddings = [(doc.page_content, emb) for doc, emb in docs_with_embeddings]
-    embeddings = [emb for _, emb in text_embeddings]
-    
-    print("Iniciando criação da vector store (FAISS.from_texts)...")
-    start_time = time.time()
-    
-    try:
-        # Create the FAISS index directly with texts and embeddings
-        vectorstore = FAISS.from_embeddings(
-            text_embeddings=text_embeddings,
-            embedding=embed_func,
-            metadatas=metadatas,
-            distance_strategy=DistanceStrategy.COSINE,
-        )
-    except Exception as e:
-        print(f"Erro ao criar vector store: {e}")
-        raise
-
-    end_time = time.time()
-    print(f"Vector store criada com sucesso em {end_time - start_time:.2f} segundos.")
-
-    return vectorstore
+def parse_and_chunk_pdf(file_path: str, file_hash: str) -> List[Document]:
+    """Parse and chunk one PDF; runs in a worker process when ingesting several."""
+    return chunk_documents(load_pdf(file_path, file_hash), EMBEDDING_MODEL)
 
 class ChatPDF:
-    def __init__(self):
-        self.vector_stores: Dict[str, FAISS] = {}
+    def __init__(self, index_type: str = INDEX_TYPE):
+        # One merged index for the session; chunks carry file_hash/source metadata.
+        # Per-file stores on disk stay exact (flat); index_type applies to the merged index.
+        self.vector_store: FAISS = None
+        self.index_type = index_type
+        self._index_owned = False  # False while the index is a file's read-only memory map
+        self.file_doc_ids: Dict[str, List[str]] = {}
         self.chat_history = None
+        self.context: ContextAssembler = None
         self.llm = load_assistant_model(ASSISTANT_MODEL)
         self.embed = load_embedding_model(EMBEDDING_MODEL)
+        self.answer_cache = get_answer_cache()
+        self.last_context_stats = None  # chunk/token counts of the last question's context
         self.loaded_files: Dict[str, str] = {}
 
+    def _add_to_index(self, file_hash: str, file_path: str, vector_store: FAISS):
+        """Add a file's store to the session index; its chunk texts stay in the file's docstore."""
+        if self.vector_store is None:
+            # A single file is searched straight from its memory-mapped index
+            self.vector_store = FAISS(
+                embedding_function=self.embed,
+                index=vector_store.index,
+                docstore=MultiDocstore(),
+                index_to_docstore_id=dict(vector_store.index_to_docstore_id),
+                distance_strategy=DistanceStrategy.COSINE,
+            )
+            self._index_owned = False
+        else:
+            if index_type_of(self.vector_store.index) != "flat":
+                self._load_exact_index()
+            self._own_index()
+            offset = self.vector_store.index.ntotal
+            self.vector_store.index.add(index_vectors(vector_store.index))
+            self.vector_store.index_to_docstore_id.update(
+                {offset + i: doc_id for i, doc_id in vector_store.index_to_docstore_id.items()}
+            )
+        self.vector_store.docstore.attach(file_hash, vector_store.docstore)
+        self.file_doc_ids[file_hash] = list(vector_store.index_to_docstore_id.values())
+        self.loaded_files[file_hash] = file_path
+
+    def _own_index(self):
+        # FAISS aborts on writes to a memory-mapped index, so copy it first
+        if not self._index_owned:
+            self.vector_store.index = owned_index(self.vector_store.index)
+            self._index_owned = True
+
+    def _apply_index_type(self):
+        if apply_index_type(self.vector_store, self.index_type) != "flat":
+            self._index_owned = True  # rebuilt in memory
+
+    def _load_exact_index(self):
+        """Rebuild the merged index as flat from the per-file stores on disk."""
+        file_hashes = list(self.file_doc_ids)
+        close_store(self.vector_store)
+        self.vector_store = None
+        for file_hash in file_hashes:
+            vector_store = load_store(f"./storage/faiss/{file_hash}", self.embed)
+            self._add_to_index(file_hash, self.loaded_files[file_hash], vector_store)
+
+    def remove_file(self, file_hash: str):
+        """Drop one document's chunks from the session index."""
+        doc_ids = self.file_doc_ids.pop(file_hash, None)
+        self.loaded_files.pop(file_hash, None)
+        if doc_ids is None:
+            return
+        if not self.file_doc_ids:
+            close_store(self.vector_store)
+            self.vector_store = None
+        elif index_type_of(self.vector_store.index) == "flat":
+            self._own_index()
+            self.vector_store.delete(doc_ids)
+            self.vector_store.docstore.detach(file_hash)
+        else:
+            # HNSW can't drop vectors, and retraining from compressed codes loses
+            # accuracy, so rebuild from the exact per-file stores instead
+            self._load_exact_index()
+            self._apply_index_type()
+
     def ingest(self, file_paths: List[str], progress_callback=None):
-        """Ingest multiple PDF files, each with its own vector store."""
+        """
+        Ingest multiple PDF files, each with its own vector store. Several new
+        files are parsed and chunked in parallel worker processes while the
+        files already parsed are embedded here; a single new file is parsed
+        in this process. A failing file is reported and skipped.
+        """
         if not file_paths:
             raise ValueError("No files provided")
 
@@ -100,93 +136,143 @@ class ChatPDF:
 
         total_files = len(file_paths)
         processed_files = 0
+        errors: Dict[str, str] = {}
+        to_parse: Dict[str, str] = {}  # file_path -> file_hash
 
-        for file_path in file_paths:
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"The file {file_path} does not exist")
+        def report(pct, msg):
+            if progress_callback:
+                progress_callback(min(pct, 1.0), msg)
 
+        for file_path in file_paths:
+            name = os.path.basename(file_path)
             try:
+                if not os.path.exists(file_path):
+                    raise FileNotFoundError(f"The file {file_path} does not exist")
+
                 file_hash = get_file_hash(file_path)
                 print(f"File hash: {file_hash}")
                 vectorstore_path = f"./storage/faiss/{file_hash}"
 
-                if file_hash in self.vector_stores:
+                if file_hash in self.file_doc_ids:
+                    processed_files += 1
+                    report(processed_files/total_files, f"Skipping existing file: {name}")
+                elif store_exists(vectorstore_path):
+                    # Open the existing store; vectors are mapped and texts stay on disk
+                    vector_store = load_store(vectorstore_path, self.embed)
+                    self._add_to_index(file_hash, file_path, vector_store)
                     processed_files += 1
-                    if progress_callback:
-                        progress_callback(processed_files/total_files, f"Skipping existing file: {os.path.basename(file_path)}")
-                    continue
-
-                if vectorstore_exists(vectorstore_path):
-                    # Load existing vector store
-                    vector_store = FAISS.load_local(vectorstore_path, self.embed, allow_dangerous_deserialization=True)
-                    if progress_callback:
-                        progress_callback(processed_files/total_files, f"Loaded existing embeddings for: {os.path.basename(file_path)}")
+                    report(processed_files/total_files, f"Loaded existing embeddings for: {name}")
                 else:
-                    # Create new vector store
-                    if progress_callback:
-                        progress_callback(processed_files/total_files, f"Processing: {os.path.basename(file_path)}")
-
-                    pages = load_pdf(file_path)
-                    vector_store = build_vector_store_with_progress(
-                        pages, 
-                        self.embed,
-                        lambda pct, msg: progress_callback(
-                            (processed_files + pct)/total_files,
-                            f"{os.path.basename(file_path)}: {msg}"
-                        ) if progress_callback else None
-                    )
-                    
-                    os.makedirs(vectorstore_path, exist_ok=True)
-                    vector_store.save_local(vectorstore_path)
-
-                self.vector_stores[file_hash] = vector_store
-                self.loaded_files[file_hash] = file_path
+                    to_parse[file_path] = file_hash
+            except Exception as e:
+                print(f"Error processing file {file_path}: {str(e)}")
+                errors[file_path] = str(e)
                 processed_files += 1
 
-                if progress_callback:
-                    progress_callback(processed_files/total_files, f"Finished: {os.path.basename(file_path)}")
-
-                session_id = f"session_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
-                self.chat_history = FileChatMessageHistory("./storage/chat_history.json", session_id)
+        def embed_and_store(file_path, get_chunks):
+            nonlocal processed_files
+            file_hash = to_parse[file_path]
+            name = os.path.basename(file_path)
+            try:
+                chunks = get_chunks()
+                vector_store = build_vector_store_with_progress(
+                    chunks,
+                    lambda chunk: [chunk],
+                    self.embed,
+                    lambda pct, msg: report((processed_files + pct)/total_files, f"{name}: {msg}")
+                )
+                vectorstore_path = f"./storage/faiss/{file_hash}"
+                save_store(vector_store, vectorstore_path)
+                save_index_type(vectorstore_path, "flat")
+                # Reopen from disk so the chunk texts don't stay in memory
+                vector_store = load_store(vectorstore_path, self.embed)
 
+                self._add_to_index(file_hash, file_path, vector_store)
+                report((processed_files + 1)/total_files, f"Finished: {name}")
             except Exception as e:
                 print(f"Error processing file {file_path}: {str(e)}")
-                raise
-
-    def ask(self, question: str):
-        """Ask a question about all loaded documents."""
-        if not self.vector_stores or not self.chat_history:
+                errors[file_path] = str(e)
+                report((processed_files + 1)/total_files, f"Failed: {name}")
+            processed_files += 1
+
+        if len(to_parse) == 1:
+            # Nothing to parallelize; a worker process would only add its
+            # startup, imports and pickling the chunks back
+            (file_path, file_hash), = to_parse.items()
+            report(processed_files/total_files, f"Parsing {os.path.basename(file_path)}...")
+            embed_and_store(file_path, lambda: parse_and_chunk_pdf(file_path, file_hash))
+        elif to_parse:
+            report(processed_files/total_files, f"Parsing {len(to_parse)} file(s)...")
+            workers = min(MAX_PARSE_WORKERS, len(to_parse))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(parse_and_chunk_pdf, path, file_hash): path for path, file_hash in to_parse.items()}
+                # Files are embedded in the order their parsing finishes
+                for future in as_completed(futures):
+                    embed_and_store(futures[future], future.result)
+
+        if self.vector_store:
+            self._apply_index_type()
+
+        if self.vector_store and not self.chat_history:
+            session_id = f"session_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+            self.chat_history = FileChatMessageHistory("./storage/chat_history", session_id)
+            self.context = ContextAssembler(self.llm, self.embed, self.chat_history)
+
+        if errors and len(errors) == total_files:
+            raise RuntimeError(f"No file could be ingested: {errors}")
+        return errors
+
+    def ask(self, question: str, file_hashes: List[str] = None):
+        """
+        Ask a question about all loaded documents, or only about the
+        documents in `file_hashes` when given.
+        """
+        if not self.vector_store or not self.chat_history:
             yield "No documents loaded. Please upload PDFs first."
             return
 
-        # Search across all vector stores
-        all_docs = []
-        for file_hash, vector_store in self.vector_stores.items():
-            docs = vector_store.similarity_search(question, k=2)  # Get 2 chunks per document
-            all_docs.extend(docs)
-
-        # Organize context with source information
-        context_parts = []
-        for doc in all_docs:
-            source = doc.metadata.get("source", "unknown")
-            context_parts.append(f"From {source}:\n{doc.page_content}")
-        
-        history_text = "\n".join([
-            f"{msg.type.upper()}: {msg.content}"
-            for msg in self.chat_history.get_messages()
-        ])
-        
-        context = "\n\n".join(context_parts) + "\n\nChat History:\n" + history_text
+        # Embed the question once and take the global top-k over the merged index
+        query_embedding = self.embed.embed_query(question)
+
+        # Same question over the same documents: replay the stored answer
+        doc_set = doc_set_key(file_hashes or self.loaded_files, ASSISTANT_MODEL, EMBEDDING_MODEL)
+        cached_answer = self.answer_cache.lookup(doc_set, question, query_embedding)
+        if cached_answer is not None:
+            yield from replay(cached_answer)
+            self.context.record_turn(question, cached_answer)
+            return
+
+        # Relevant but mutually different chunks, then cleaned up and trimmed to the question
+        all_docs = self.vector_store.max_marginal_relevance_search_by_vector(
+            query_embedding,
+            k=TOP_K,
+            fetch_k=FILTER_FETCH_K if file_hashes else MMR_FETCH_K,
+            lambda_mult=MMR_LAMBDA,
+            filter={"file_hash": list(file_hashes)} if file_hashes else None,
+        )
+        all_docs, self.last_context_stats = compress_documents(question, all_docs)
+
+        system_prompt = (
+            "You are an assistant analyzing multiple documents. "
+            "When answering questions, consider information from all provided documents. "
+            "If information comes from a specific document, mention the source. "
+            "Combine insights from different documents when appropriate. "
+            "Answer in the same language as the question. "
+            "Provide detailed responses and ask for clarification if needed."
+        )
+
+        # Chunks (with their source) and history, cut to the model's token budget
+        docs_text, history_text = self.context.assemble(
+            question,
+            query_embedding,
+            all_docs,
+            format_doc=lambda doc: f"From {doc.metadata.get('source', 'unknown')}:\n{doc.page_content}",
+            system_prompt=system_prompt,
+        )
+        context = docs_text + "\n\nChat History:\n" + history_text
 
         messages = [
-            {"role": "system", "content": (
-                "You are an assistant analyzing multiple documents. "
-                "When answering questions, consider information from all provided documents. "
-                "If information comes from a specific document, mention the source. "
-                "Combine insights from different documents when appropriate. "
-                "Answer in the same language as the question. "
-                "Provide detailed responses and ask for clarification if needed."
-            )},
+            {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"Context from documents:\n{context}\n\nQuestion: {question}"}
         ]
 
@@ -199,19 +285,33 @@ class ChatPDF:
                 yield content_str
 
         # Save to history
-        self.chat_history.add_message(HumanMessage(content=question))
-        self.chat_history.add_message(SystemMessage(content=full_response))
+        self.context.record_turn(question, full_response)
+        self.answer_cache.store(doc_set, question, query_embedding, full_response)
+
+    def forget_cached_answers(self):
+        """Drop the cached answers for the loaded document set."""
+        self.answer_cache.invalidate(doc_set_key(self.loaded_files, ASSISTANT_MODEL, EMBEDDING_MODEL))
 
     def clear(self):
+        close_store(self.vector_store)
         self.vector_store = None
+        self._index_owned = False
+        self.file_doc_ids = {}
+        self.loaded_files = {}
         self.chat_history = None
+        if self.context:
+            self.context.close()
+        self.context = None
 
     def get_loaded_files(self) -> Dict[str, str]:
         """Get mapping of file hashes to file paths."""
         return self.loaded_files
 
     def get_file_vectorstore(self, file_hash: str):
-        """Get the vector store for a specific file."""
-        return self.vector_stores.get(file_hash)
+        """Get the stored vector store for a specific file."""
+        vectorstore_path = f"./storage/faiss/{file_hash}"
+        if file_hash not in self.file_doc_ids or not store_exists(vectorstore_path):
+            return None
+        return load_store(vectorstore_path, self.embed)
 
     
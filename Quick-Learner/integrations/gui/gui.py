@@ -7,6 +7,7 @@ from pathlib import Path
 from streamlit_chat import message
 import streamlit.components.v1 as components
 from ..document_loaders import pdf_loader, chm_loader
+from ..helpers.fingerprint import spool_and_hash, remember_spooled_hash
 
 st.set_page_config(page_title="Quick Learner", page_icon="🤓", layout="wide")
 
@@ -35,20 +36,35 @@ def read_and_save_file():
     if "streaming_placeholder" in st.session_state:
         del st.session_state["streaming_placeholder"]
     
+    file_paths = []
+    file_names = {}
     for file in st.session_state["file_uploader"]:
         # Get the file extension (without the dot)
         with tempfile.NamedTemporaryFile(delete=False) as tf:
-            tf.write(file.getbuffer())
-            file_path = tf.name
-        
-        progress_bar = st.progress(0, text=f"Ingesting {file.name}...")
-        
-        def update_progress(p, label=""):
-            progress_bar.progress(p, text=label)
+            # Hash while spooling so ingest doesn't have to read the file again
+            file_hash = spool_and_hash(file.getbuffer(), tf)
+        remember_spooled_hash(tf.name, file_hash)
+        file_paths.append(tf.name)
+        file_names[tf.name] = file.name
 
-        st.session_state["assistant"].ingest(file_path, progress_callback=update_progress)
-        
-        os.remove(file_path)
+    progress_bar = st.progress(0, text="Ingesting files...")
+
+    def update_progress(p, label=""):
+        progress_bar.progress(p, text=label)
+
+    try:
+        if isinstance(st.session_state["assistant"], pdf_loader.ChatPDF):
+            # PDFs are ingested together so they can be parsed in parallel
+            errors = st.session_state["assistant"].ingest(file_paths, progress_callback=update_progress)
+            for file_path, error in (errors or {}).items():
+                st.warning(f"Falha ao processar {file_names[file_path]}: {error}")
+        else:
+            for file, file_path in zip(st.session_state["file_uploader"], file_paths):
+                update_progress(0, f"Ingesting {file.name}...")
+                st.session_state["assistant"].ingest(file_path, progress_callback=update_progress)
+    finally:
+        for file_path in file_paths:
+            os.remove(file_path)
 
 def render_chat_interface():
     st.markdown('<div class="chat-container">', unsafe_allow_html=True)
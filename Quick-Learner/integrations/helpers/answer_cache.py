@@ -0,0 +1,136 @@
+#answer_cache.py
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Iterable, Iterator, Optional, Sequence
+import numpy as np
+
+CACHE_PATH = "./storage/answer_cache.sqlite"
+SIMILARITY_THRESHOLD = 0.95  # cosine similarity for two questions to count as the same
+MIN_QUESTION_CHARS = 20  # short follow-ups ("and the second one?") depend on the chat, not the documents
+TTL_SECONDS = 7 * 24 * 3600
+MAX_ENTRIES_PER_SET = 200  # least recently used answers are dropped past this
+REPLAY_CHUNK_CHARS = 40  # characters per chunk when replaying a cached answer
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def doc_set_key(file_hashes: Iterable[str], *models: str) -> str:
+    """Key of a document set: the loaded file hashes plus the models answering over them."""
+    key = "|".join(models) + "|" + ",".join(sorted(file_hashes))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def replay(answer: str) -> Iterator[str]:
+    """Yield a cached answer in chunks, like a streamed LLM response."""
+    for start in range(0, len(answer), REPLAY_CHUNK_CHARS):
+        yield answer[start:start + REPLAY_CHUNK_CHARS]
+
+
+class AnswerCache:
+    """
+    Answers already given over a document set, found again by question
+    embedding. Entries live in SQLite; the question vectors of a set are
+    loaded into one matrix on first lookup, so matching a new question is a
+    single matrix-vector product. Entries expire after TTL_SECONDS and each
+    set keeps at most MAX_ENTRIES_PER_SET.
+    """
+    def __init__(self, path: str = CACHE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers (doc_set TEXT NOT NULL, question TEXT NOT NULL, "
+            "answer TEXT NOT NULL, vector BLOB NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_doc_set ON answers (doc_set)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._sets = {}  # doc_set -> (rowids, normalized question vectors)
+        self.hits = 0
+        self.misses = 0
+
+    def _vectors(self, doc_set):
+        if doc_set not in self._sets:
+            rows = self._conn.execute(
+                "SELECT rowid, vector FROM answers WHERE doc_set = ? AND created > ?",
+                (doc_set, time.time() - TTL_SECONDS),
+            ).fetchall()
+            rowids = np.array([row[0] for row in rows], dtype=np.int64)
+            vectors = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows]) if rows else None
+            self._sets[doc_set] = (rowids, vectors)
+        return self._sets[doc_set]
+
+    def lookup(self, doc_set: str, question: str, query_embedding: Sequence[float]) -> Optional[str]:
+        """The cached answer to a near-identical question over this document set, if any."""
+        if len(question.strip()) < MIN_QUESTION_CHARS:
+            return None
+        query = _normalize(query_embedding)
+        with self._lock:
+            rowids, vectors = self._vectors(doc_set)
+            if vectors is None or vectors.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            similarity = vectors @ query
+            best = int(np.argmax(similarity))
+            if similarity[best] < SIMILARITY_THRESHOLD:
+                self.misses += 1
+                return None
+            rowid = int(rowids[best])
+            row = self._conn.execute(
+                "SELECT answer FROM answers WHERE rowid = ? AND created > ?", (rowid, time.time() - TTL_SECONDS)
+            ).fetchone()
+            if row is None:
+                # Evicted or expired since the set's vectors were loaded
+                self._sets.pop(doc_set, None)
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE rowid = ?", (time.time(), rowid))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def store(self, doc_set: str, question: str, query_embedding: Sequence[float], answer: str):
+        if len(question.strip()) < MIN_QUESTION_CHARS or not answer.strip():
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_set, question, answer, _normalize(query_embedding).tobytes(), now, now),
+            )
+            # Expired answers anywhere, then the least recently used ones of this set
+            self._conn.execute("DELETE FROM answers WHERE created <= ?", (now - TTL_SECONDS,))
+            self._conn.execute(
+                "DELETE FROM answers WHERE doc_set = ? AND rowid NOT IN "
+                "(SELECT rowid FROM answers WHERE doc_set = ? ORDER BY last_used DESC LIMIT ?)",
+                (doc_set, doc_set, MAX_ENTRIES_PER_SET),
+            )
+            self._conn.commit()
+            self._sets.pop(doc_set, None)
+
+    def invalidate(self, doc_set: str = None):
+        """Forget the answers of one document set, or of all of them."""
+        with self._lock:
+            if doc_set is None:
+                self._conn.execute("DELETE FROM answers")
+                self._sets.clear()
+            else:
+                self._conn.execute("DELETE FROM answers WHERE doc_set = ?", (doc_set,))
+                self._sets.pop(doc_set, None)
+            self._conn.commit()
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def get_answer_cache() -> AnswerCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache()
+        return _cache
@@ -1,29 +1,117 @@
 import os
 import json
-from typing import List
+import threading
+from typing import List, Sequence
 from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+COMPACT_EVERY = 200  # appended messages between compactions
+TAIL_BLOCK_SIZE = 64 * 1024  # bytes read per step when reading the file backwards
 
 class FileChatMessageHistory(BaseChatMessageHistory):
+    """
+    Chat history kept as one JSON message per line in {session_id}.jsonl.
+    New messages are appended, never rewritten; the full history is read at
+    most once and then served from memory, and the last few messages can be
+    read from the end of the file without parsing the rest. Every
+    COMPACT_EVERY messages the file is rewritten without unreadable lines,
+    if it has any; no message is ever dropped.
+    """
     def __init__(self, storage_path: str, session_id: str):
-        self.file_path = os.path.join(storage_path, f"{session_id}.json")
+        self.file_path = os.path.join(storage_path, f"{session_id}.jsonl")
         os.makedirs(storage_path, exist_ok=True)
-        if not os.path.exists(self.file_path):
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump([], f)
+        with open(self.file_path, 'ab+') as f:
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Terminate a torn last line so the next append starts on its own line
+                    f.write(b"\n")
+        self._messages = None  # full history, loaded on first use
+        self._bad_lines = 0
+        self._appended = 0
+        self._lock = threading.Lock()
 
-    def get_messages(self) -> List[BaseMessage]:
-        with open(self.file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            messages = messages_from_dict(data)
-            return messages
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self.get_messages()
+
+    def get_messages(self, last: int = None) -> List[BaseMessage]:
+        """All messages, or only the `last` ones (read tail-first if not cached)."""
+        with self._lock:
+            if self._messages is None and last is not None:
+                return self._read_tail(last)
+            self._load()
+            start = max(len(self._messages) - last, 0) if last is not None else 0
+            return self._messages[start:]
 
     def add_message(self, message: BaseMessage) -> None:
-        messages = self.get_messages()
-        messages.append(message)
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump(messages_to_dict(messages), f, ensure_ascii=False, indent=2)
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        lines = "".join(json.dumps(message_to_dict(m), ensure_ascii=False) + "\n" for m in messages)
+        with self._lock:
+            with open(self.file_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+            if self._messages is not None:
+                self._messages.extend(messages)
+            self._appended += len(messages)
+            if self._appended >= COMPACT_EVERY:
+                self._compact()
 
     def clear(self) -> None:
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump([], f)
+        with self._lock:
+            open(self.file_path, 'w', encoding='utf-8').close()
+            self._messages = []
+            self._bad_lines = 0
+            self._appended = 0
+
+    def _load(self):
+        if self._messages is not None:
+            return
+        records = []
+        self._bad_lines = 0
+        with open(self.file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A torn last line from an interrupted write; dropped on compaction
+                    self._bad_lines += 1
+        self._messages = messages_from_dict(records)
+
+    def _read_tail(self, count: int) -> List[BaseMessage]:
+        if count <= 0:
+            return []
+        records = []
+        with open(self.file_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            buffer = b""
+            while position > 0 and len(records) < count:
+                step = min(TAIL_BLOCK_SIZE, position)
+                position -= step
+                f.seek(position)
+                buffer = f.read(step) + buffer
+                lines = buffer.split(b"\n")
+                # The first piece may be cut mid-line unless we reached the start
+                buffer = lines.pop(0) if position > 0 else b""
+                for line in reversed(lines):
+                    if len(records) >= count:
+                        break
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return messages_from_dict(records[::-1])
+
+    def _compact(self):
+        self._appended = 0
+        self._load()
+        if not self._bad_lines:
+            return
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for message in self._messages:
+                f.write(json.dumps(message_to_dict(message), ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.file_path)
+        self._bad_lines = 0
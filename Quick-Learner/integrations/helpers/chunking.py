@@ -0,0 +1,100 @@
+#chunking.py
+import re
+from html import unescape
+from html.parser import HTMLParser
+from typing import Iterable, List
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# (chunk size, overlap) in approximate tokens, kept under each model's context window
+CHUNK_SETTINGS = {
+    "all-minilm": (200, 30),  # 256-token context
+    "mxbai-embed-large": (400, 60),  # 512-token context
+    "nomic-embed-text": (512, 80),  # 8192-token context, but smaller chunks retrieve better
+    "gte-Qwen2-7B-instruct": (1024, 128),
+}
+DEFAULT_CHUNK_SETTINGS = (400, 60)
+
+BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "tr", "table", "section", "article",
+    "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "dt", "dd", "title"
+}
+SKIPPED_TAGS = {"script", "style", "head", "noscript", "object", "iframe"}
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.title = ""
+        self._skip_depth = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        if tag == "title":
+            self._in_title = True
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        if tag == "title":
+            self._in_title = False
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        # <title> usually lives inside <head>, which is otherwise skipped
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html: str):
+    """Strip markup, scripts and styles from an HTML page. Returns (title, text)."""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    text = unescape("".join(parser.parts))
+    text = re.sub(r"[ \t\r\f\v]+", " ", text)
+    text = re.sub(r"\s*\n\s*", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return parser.title.strip(), text.strip()
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough count without a tokenizer: ~4 characters per token for Latin
+    # text, but every CJK character is a token of its own
+    cjk = len(re.findall(r"[぀-ヿ㐀-鿿가-힯]", text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def get_text_splitter(embedding_model: str) -> RecursiveCharacterTextSplitter:
+    chunk_size, chunk_overlap = CHUNK_SETTINGS.get(embedding_model, DEFAULT_CHUNK_SETTINGS)
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=estimate_tokens,
+        add_start_index=True,
+    )
+
+
+def chunk_documents(docs: Iterable[Document], embedding_model: str) -> List[Document]:
+    """
+    Split documents into size-bounded, overlapping chunks for the given
+    embedding model. Chunks keep the document metadata (source, page, ...)
+    plus their character offset ("start_index") and position ("chunk").
+    """
+    splitter = get_text_splitter(embedding_model)
+    chunks = []
+    for doc in docs:
+        if not doc.page_content.strip():
+            continue
+        for i, chunk in enumerate(splitter.split_documents([doc])):
+            chunk.metadata["chunk"] = i
+            chunks.append(chunk)
+    return chunks
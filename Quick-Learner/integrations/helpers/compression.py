@@ -0,0 +1,117 @@
+#compression.py
+import re
+from typing import List
+from langchain_core.documents import Document
+from .chunking import estimate_tokens
+
+MAX_CHUNK_TOKENS = 250  # longer chunks are cut down to their most query-relevant sentences
+MIN_CHUNK_TOKENS = 8  # chunks left with less than this after cleanup are dropped
+DUPLICATE_JACCARD = 0.8  # word-shingle overlap above which a chunk repeats an earlier one
+SHINGLE_WORDS = 3
+GAP_MARKER = "[...]"  # marks sentences cut out of a trimmed chunk
+
+PAGE_NUMBER_LINE = re.compile(r"^\s*(p(a|á)g(e|ina)?\.?\s*)?\d{1,4}(\s*(/|of|de)\s*\d{1,4})?\s*$", re.IGNORECASE)
+SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+")
+FILLER_RUN = re.compile(r"([.\-_=·*~ ])\1{3,}")  # table-of-contents leaders, rules, padding
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _line_key(line: str) -> str:
+    # Headers/footers differ only in page numbers and spacing
+    return re.sub(r"\d+", "#", " ".join(line.lower().split()))
+
+
+def _shingles(text: str) -> set:
+    words = WORD.findall(text.lower())
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(max(len(words) - SHINGLE_WORDS + 1, 1))}
+
+
+def _query_terms(question: str) -> set:
+    return {word for word in WORD.findall(question.lower()) if len(word) > 2}
+
+
+def trim_to_relevant(text: str, terms: set, max_tokens: int = MAX_CHUNK_TOKENS) -> str:
+    """Keep the sentences sharing the most words with the query, in their original order."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    sentences, line_of = [], []
+    for line_no, line in enumerate(text.split("\n")):
+        for sentence in SENTENCE_END.split(line):
+            if sentence.strip():
+                sentences.append(sentence.strip())
+                line_of.append(line_no)
+    scores = [len(terms & set(WORD.findall(sentence.lower()))) for sentence in sentences]
+
+    # Best matches first; without any match this keeps the opening sentences
+    keep, used = set(), 0
+    for i in sorted(range(len(sentences)), key=lambda i: (-scores[i], i)):
+        cost = estimate_tokens(sentences[i])
+        if used + cost > max_tokens:
+            continue
+        keep.add(i)
+        used += cost
+    if not keep:
+        return text[:len(text) * max_tokens // estimate_tokens(text)].rstrip() + " " + GAP_MARKER
+
+    parts, previous = [], -1
+    for i in sorted(keep):
+        if parts:
+            if i != previous + 1:
+                parts.append(f" {GAP_MARKER}\n")
+            else:
+                parts.append("\n" if line_of[i] != line_of[previous] else " ")
+        parts.append(sentences[i])
+        previous = i
+    if previous != len(sentences) - 1:
+        parts.append(f" {GAP_MARKER}")
+    return "".join(parts)
+
+
+def compress_documents(question: str, docs: List[Document]):
+    """
+    Post-retrieval cleanup of ranked chunks before they go into a prompt:
+    drops lines already seen in a higher-ranked chunk (page headers and
+    footers, splitter overlap) and bare page numbers, shortens dot leaders
+    and other filler runs, drops chunks that
+    repeat an earlier one, and trims long chunks to the sentences most
+    relevant to the question. Returns (new documents, stats); the
+    retrieved documents themselves are left untouched.
+    """
+    terms = _query_terms(question)
+    seen_lines = set()
+    kept_shingles = []
+    compressed = []
+
+    for doc in docs:
+        lines = []
+        for line in doc.page_content.splitlines():
+            key = _line_key(line)
+            if not key or PAGE_NUMBER_LINE.match(line):
+                continue
+            # Short lines ("Introduction", "Table 1") can repeat legitimately
+            if len(key) > 20 and key in seen_lines:
+                continue
+            seen_lines.add(key)
+            lines.append(FILLER_RUN.sub(r"\1\1\1", line.strip()))
+        text = "\n".join(lines)
+        if estimate_tokens(text) < MIN_CHUNK_TOKENS:
+            continue
+
+        shingles = _shingles(text)
+        if any(len(shingles & other) / len(shingles | other) >= DUPLICATE_JACCARD for other in kept_shingles):
+            continue
+        kept_shingles.append(shingles)
+        compressed.append(Document(page_content=trim_to_relevant(text, terms), metadata=dict(doc.metadata)))
+
+    stats = {
+        "chunks_in": len(docs),
+        "chunks_out": len(compressed),
+        "tokens_before": sum(estimate_tokens(doc.page_content) for doc in docs),
+        "tokens_after": sum(estimate_tokens(doc.page_content) for doc in compressed),
+    }
+    saved = stats["tokens_before"] - stats["tokens_after"]
+    print(
+        f"Contexto: {stats['tokens_before']} -> {stats['tokens_after']} tokens "
+        f"({saved} economizados, {stats['chunks_out']}/{stats['chunks_in']} trechos)"
+    )
+    return compressed, stats
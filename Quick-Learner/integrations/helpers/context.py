@@ -0,0 +1,192 @@
+#context.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Sequence
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage, SystemMessage
+from .chunking import estimate_tokens
+
+DEFAULT_NUM_CTX = 4096  # Ollama's context window when the model sets no num_ctx
+ANSWER_RESERVE = 1024  # tokens of the window left for the answer
+PROMPT_OVERHEAD = 64  # section headers and chat template tokens
+DOCS_SHARE = 0.6  # of the prompt budget for retrieved chunks; history gets the rest
+
+RECENT_TURNS = 3  # latest question/answer pairs kept verbatim
+SUMMARY_BATCH_TURNS = 2  # turns that leave the recent window before the summary is updated
+SUMMARY_MAX_BATCH = 6  # turns folded into the summary per LLM call
+SUMMARY_MAX_TOKENS = 300
+SUMMARY_TURN_TOKENS = 600  # each turn is cut to this before being summarized
+RECALL_TURNS = 2  # older turns pulled back in by similarity to the question
+RECALL_MIN_SIMILARITY = 0.5
+RESUME_TURNS = 50  # turns read back from a saved chat when it is reopened
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant about some documents. "
+    "Merge the new exchanges into the current summary. Keep facts, names, numbers, decisions and open questions; "
+    "drop greetings and filler. Reply with the updated summary only, in at most {words} words, "
+    "in the language of the conversation."
+)
+
+
+def prompt_budget(llm) -> int:
+    """Prompt tokens available for `llm`: its context window minus the answer reserve."""
+    num_ctx = getattr(llm, "num_ctx", None) or DEFAULT_NUM_CTX
+    return max(num_ctx - ANSWER_RESERVE, 512)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    return text[:len(text) * max_tokens // tokens].rstrip() + " [...]"
+
+
+def format_turn(question: str, answer: str) -> str:
+    return f"HUMAN: {question}\nSYSTEM: {answer}"
+
+
+class ContextAssembler:
+    """
+    Builds the documents and history sections of a prompt within the model's
+    token budget. Recent turns go in verbatim, older ones are folded into a
+    rolling summary (and shown verbatim until they are), and older turns similar to the question are pulled back
+    in. Summaries and turn embeddings are updated on a background thread
+    after each answer, so assembling a prompt never waits on the LLM.
+    """
+    def __init__(self, llm, embed, chat_history, budget: int = None):
+        self.llm = llm
+        self.embed = embed
+        self.chat_history = chat_history
+        self.budget = budget or prompt_budget(llm)
+        self.turns = []  # (question, answer)
+        self.summary = ""
+        self.summarized_upto = 0  # turns[:summarized_upto] are in the summary
+        self._vectors = []  # one normalized embedding per turn, filled in the background
+        self._lock = threading.Lock()
+        self._worker = ThreadPoolExecutor(max_workers=1)
+
+        # Only the tail of a long saved chat is read; older turns are neither
+        # summarized nor recalled
+        messages = chat_history.get_messages(last=2 * RESUME_TURNS)
+        for human, answer in zip(messages[0::2], messages[1::2]):
+            self.turns.append((human.content, answer.content))
+        if self.turns:
+            self._worker.submit(self._update)
+
+    def assemble(
+        self,
+        question: str,
+        query_embedding: Sequence[float],
+        docs: List[Document],
+        format_doc: Callable[[Document], str] = lambda doc: doc.page_content,
+        system_prompt: str = "",
+    ):
+        """Returns (documents text, history text) that fit the budget together."""
+        available = self.budget - estimate_tokens(system_prompt) - estimate_tokens(question) - PROMPT_OVERHEAD
+
+        # Chunks in rank order while they fit; unused room goes to the history
+        docs_budget = int(available * DOCS_SHARE)
+        doc_parts, used = [], 0
+        for doc in docs:
+            text = format_doc(doc)
+            cost = estimate_tokens(text)
+            if used + cost > docs_budget:
+                if not doc_parts:
+                    # Better a cut top chunk than no context at all
+                    doc_parts.append(truncate_to_tokens(text, docs_budget))
+                    used = docs_budget
+                break
+            doc_parts.append(text)
+            used += cost
+
+        history_text = self._history(query_embedding, available - used)
+        return "\n\n".join(doc_parts), history_text
+
+    def _history(self, query_embedding, budget: int) -> str:
+        with self._lock:
+            turns = list(self.turns)
+            summary, summarized_upto = self.summary, self.summarized_upto
+            vectors = list(self._vectors)
+
+        sections = []
+        if summary and budget > 0:
+            summary_text = truncate_to_tokens(summary, min(SUMMARY_MAX_TOKENS, budget))
+            budget -= estimate_tokens(summary_text)
+            sections.append(("Summary of the earlier conversation", [summary_text]))
+
+        # Newest turns first, down to the first turn not yet in the summary, so
+        # turns waiting to be summarized are not lost in between
+        recent = []
+        for i in range(len(turns) - 1, summarized_upto - 1, -1):
+            text = format_turn(*turns[i])
+            cost = estimate_tokens(text)
+            if cost > budget:
+                if not recent and budget > 0:
+                    recent.append((i, truncate_to_tokens(text, budget)))
+                    budget = 0
+                break
+            recent.append((i, text))
+            budget -= cost
+
+        recalled = []
+        shown = {i for i, _ in recent}
+        if vectors and budget > 0:
+            query = np.asarray(query_embedding, dtype=np.float32)
+            query /= np.linalg.norm(query) or 1.0
+            similarity = np.asarray(vectors, dtype=np.float32) @ query
+            for i in np.argsort(-similarity)[:RECALL_TURNS + len(shown)]:
+                i = int(i)
+                if i in shown or similarity[i] < RECALL_MIN_SIMILARITY or len(recalled) >= RECALL_TURNS:
+                    continue
+                text = format_turn(*turns[i])
+                cost = estimate_tokens(text)
+                if cost <= budget:
+                    recalled.append((i, text))
+                    budget -= cost
+
+        if recalled:
+            sections.append(("Relevant earlier messages", [text for _, text in sorted(recalled)]))
+        if recent:
+            sections.append(("Recent messages", [text for _, text in sorted(recent)]))
+        return "\n\n".join(f"{title}:\n" + "\n".join(texts) for title, texts in sections)
+
+    def record_turn(self, question: str, answer: str):
+        """Save a finished turn and refresh embeddings/summary in the background."""
+        self.chat_history.add_messages([HumanMessage(content=question), SystemMessage(content=answer)])
+        with self._lock:
+            self.turns.append((question, answer))
+        self._worker.submit(self._update)
+
+    def _update(self):
+        try:
+            with self._lock:
+                turns = list(self.turns)
+                start = len(self._vectors)
+            for question, answer in turns[start:]:
+                vector = np.asarray(self.embed.embed_query(format_turn(question, answer)), dtype=np.float32)
+                with self._lock:
+                    self._vectors.append(vector / (np.linalg.norm(vector) or 1.0))
+
+            # Catch up in bounded steps so each summary prompt stays small
+            while len(turns) - RECENT_TURNS - self.summarized_upto >= SUMMARY_BATCH_TURNS:
+                end = min(len(turns) - RECENT_TURNS, self.summarized_upto + SUMMARY_MAX_BATCH)
+                self._summarize(turns[self.summarized_upto:end], end)
+        except Exception as e:
+            print(f"Erro ao atualizar o resumo da conversa: {e}")
+
+    def _summarize(self, turns, end):
+        exchanges = "\n\n".join(truncate_to_tokens(format_turn(*turn), SUMMARY_TURN_TOKENS) for turn in turns)
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT.format(words=SUMMARY_MAX_TOKENS * 3 // 4)},
+            {"role": "user", "content": f"Current summary:\n{self.summary or '(empty)'}\n\nNew exchanges:\n{exchanges}"},
+        ]
+        summary = str(self.llm.invoke(messages).content).strip()
+        with self._lock:
+            self.summary = truncate_to_tokens(summary, SUMMARY_MAX_TOKENS)
+            self.summarized_upto = end
+
+    def close(self):
+        self._worker.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,159 @@
+#disk_store.py
+import os
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Union
+import faiss
+from langchain_core.documents import Document
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from .index_types import configure_search
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite"
+LEGACY_DOCSTORE_FILE = "index.pkl"  # pickled docstore written by FAISS.save_local
+
+
+def store_exists(folder_path: str) -> bool:
+    return os.path.exists(os.path.join(folder_path, INDEX_FILE)) and os.path.exists(os.path.join(folder_path, DOCSTORE_FILE))
+
+
+class SQLiteDocstore(Docstore):
+    """
+    Read-only docstore over a saved store's docstore.sqlite. Chunk texts and
+    metadata stay on disk and are only read for the hits of a search.
+    """
+    def __init__(self, path: str):
+        uri = Path(path).resolve().as_uri() + "?mode=ro"
+        self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def search(self, search: str) -> Union[str, Document]:
+        with self._lock:
+            row = self._conn.execute("SELECT text, metadata FROM chunks WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def position_ids(self) -> Dict[int, str]:
+        """FAISS row -> chunk id, the only per-chunk data kept in memory."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT position, id FROM chunks ORDER BY position"))
+
+    def close(self):
+        self._conn.close()
+
+
+class MultiDocstore(Docstore):
+    """Looks chunk ids up across several docstores, e.g. one per loaded file."""
+    def __init__(self):
+        self.docstores: Dict[str, Docstore] = {}
+
+    def attach(self, name: str, docstore: Docstore):
+        self.docstores[name] = docstore
+
+    def detach(self, name: str):
+        docstore = self.docstores.pop(name, None)
+        if docstore is not None:
+            close_docstore(docstore)
+
+    def search(self, search: str) -> Union[str, Document]:
+        for docstore in self.docstores.values():
+            doc = docstore.search(search)
+            if isinstance(doc, Document):
+                return doc
+        return f"ID {search} not found."
+
+    def delete(self, ids: List) -> None:
+        # Saved stores are shared on disk; callers detach whole docstores instead
+        pass
+
+    def close(self):
+        for docstore in self.docstores.values():
+            close_docstore(docstore)
+        self.docstores = {}
+
+
+def close_docstore(docstore):
+    """Close a docstore's SQLite connection(s); in-memory docstores have none."""
+    close = getattr(docstore, "close", None)
+    if close:
+        close()
+
+
+def close_store(vector_store: FAISS):
+    """Release what a store opened by load_store holds besides its index."""
+    if vector_store is not None:
+        close_docstore(vector_store.docstore)
+
+
+def owned_index(index):
+    """
+    In-memory copy of an index. Memory-mapped indexes are read-only and FAISS
+    aborts the process on any write to them, so copy before add/merge/remove.
+    """
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+
+def save_store(vector_store: FAISS, folder_path: str):
+    """
+    Save a LangChain FAISS store as index.faiss plus a docstore.sqlite with
+    one row per chunk, in FAISS row order. Replaces any pickled index.pkl.
+    """
+    os.makedirs(folder_path, exist_ok=True)
+    index_path = os.path.join(folder_path, INDEX_FILE)
+    db_path = os.path.join(folder_path, DOCSTORE_FILE)
+
+    faiss.write_index(vector_store.index, index_path + ".tmp")
+
+    tmp_db_path = db_path + ".tmp"
+    if os.path.exists(tmp_db_path):
+        os.remove(tmp_db_path)
+    conn = sqlite3.connect(tmp_db_path)
+    try:
+        conn.execute(
+            "CREATE TABLE chunks (position INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+            "text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        rows = (
+            (position, doc_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False))
+            for position, doc_id in sorted(vector_store.index_to_docstore_id.items())
+            for doc in [vector_store.docstore.search(doc_id)]
+        )
+        conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(tmp_db_path, db_path)
+    legacy_path = os.path.join(folder_path, LEGACY_DOCSTORE_FILE)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+
+def load_store(folder_path: str, embeddings) -> FAISS:
+    """
+    Open a store saved by save_store without reading it into memory: the
+    index is memory-mapped where FAISS supports it and chunk texts are read
+    from SQLite on demand. The result is read-only; see owned_index.
+    """
+    index_path = os.path.join(folder_path, INDEX_FILE)
+    try:
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        # Index types or platforms without mmap support are read normally
+        index = faiss.read_index(index_path)
+    configure_search(index)
+
+    docstore = SQLiteDocstore(os.path.join(folder_path, DOCSTORE_FILE))
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=docstore.position_ids(),
+        distance_strategy=DistanceStrategy.COSINE,
+    )
@@ -0,0 +1,158 @@
+#embedding_cache.py
+import os
+import re
+import hashlib
+import threading
+import numpy as np
+
+CACHE_DIR = "./storage/embedding_cache"
+MAX_ENTRIES = 200_000  # per embedding model; least recently used chunks are evicted past this
+EVICT_LOW_WATER = 0.9  # eviction trims down to this fraction of max_entries, so it runs rarely
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest().encode("ascii")
+
+
+class EmbeddingCache:
+    """
+    Persistent chunk embedding cache for one embedding model, keyed by the
+    SHA-1 of the chunk text. Vectors live in a single float32 matrix with a
+    key -> row dict, saved as one .npz file; once the cache grows past
+    max_entries, least recently used rows are dropped down to
+    EVICT_LOW_WATER of it.
+    """
+    def __init__(self, model_name: str, cache_dir: str = CACHE_DIR, max_entries: int = MAX_ENTRIES):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.path = os.path.join(cache_dir, f"{safe_name}.npz")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._clock = 0
+
+        self._keys = []
+        self._rows = {}
+        self._vectors = None
+        self._last_used = np.zeros(0, dtype=np.int64)
+        self._size = 0
+
+        if os.path.exists(self.path):
+            try:
+                with np.load(self.path) as data:
+                    keys, vectors, last_used = data["keys"], data["vectors"], data["last_used"]
+                self._keys = keys.tolist()
+                self._rows = {key: i for i, key in enumerate(self._keys)}
+                self._vectors = vectors
+                self._last_used = last_used.astype(np.int64)
+                self._size = len(self._keys)
+                self._clock = int(last_used.max()) if self._size else 0
+            except Exception as e:
+                print(f"Cache de embeddings ignorado ({self.path}): {e}")
+
+    def get_many(self, texts):
+        """Cached vectors for `texts`, with None where the chunk is not cached."""
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            self._clock += 1
+            found = []
+            for key in keys:
+                row = self._rows.get(key)
+                if row is None:
+                    self.misses += 1
+                    found.append(None)
+                else:
+                    self.hits += 1
+                    self._last_used[row] = self._clock
+                    found.append(self._vectors[row].tolist())
+            return found
+
+    def put_many(self, texts, vectors):
+        new = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._clock += 1
+            if self._vectors is None or self._vectors.shape[1] != new.shape[1]:
+                # First use, or the model's dimension changed: start over
+                self._keys, self._rows, self._size = [], {}, 0
+                self._vectors = np.empty((0, new.shape[1]), dtype=np.float32)
+                self._last_used = np.zeros(0, dtype=np.int64)
+
+            for text, vector in zip(texts, new):
+                key = text_key(text)
+                row = self._rows.get(key)
+                if row is None:
+                    row = self._size
+                    self._grow(row + 1)
+                    self._keys.append(key)
+                    self._rows[key] = row
+                    self._size += 1
+                self._vectors[row] = vector
+                self._last_used[row] = self._clock
+
+            if self._size > self.max_entries:
+                self._evict()
+            self._dirty = True
+
+    def _grow(self, needed):
+        # Amortized doubling so adding rows stays cheap
+        capacity = len(self._vectors)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        vectors = np.empty((capacity, self._vectors.shape[1]), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        last_used = np.zeros(capacity, dtype=np.int64)
+        last_used[:self._size] = self._last_used[:self._size]
+        self._vectors, self._last_used = vectors, last_used
+
+    def _evict(self):
+        # Keep the most recently used rows up to the low-water mark, compacting the arrays
+        target = max(int(self.max_entries * EVICT_LOW_WATER), 1)
+        keep = np.sort(np.argpartition(-self._last_used[:self._size], target - 1)[:target])
+        self._vectors = self._vectors[keep]
+        self._last_used = self._last_used[keep]
+        self._keys = [self._keys[i] for i in keep]
+        self._rows = {key: i for i, key in enumerate(self._keys)}
+        self._size = len(self._keys)
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp.npz"
+            np.savez(
+                tmp_path,
+                keys=np.array(self._keys, dtype="S40"),
+                vectors=self._vectors[:self._size],
+                last_used=self._last_used[:self._size],
+            )
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+
+def get_embedding_cache(model_name: str) -> EmbeddingCache:
+    with _caches_lock:
+        if model_name not in _caches:
+            _caches[model_name] = EmbeddingCache(model_name)
+        return _caches[model_name]
+
+
+def embed_documents_cached(embed_func, texts, embed_missing=None):
+    """
+    embed_func.embed_documents, only sending the chunks not cached yet.
+    `embed_missing` replaces embed_func.embed_documents for those chunks.
+    """
+    cache = get_embedding_cache(getattr(embed_func, "model", type(embed_func).__name__))
+    embeddings = cache.get_many(texts)
+    missing = [i for i, emb in enumerate(embeddings) if emb is None]
+    if missing:
+        new = (embed_missing or embed_func.embed_documents)([texts[i] for i in missing])
+        cache.put_many([texts[i] for i in missing], new)
+        for i, emb in zip(missing, new):
+            embeddings[i] = emb
+    return embeddings
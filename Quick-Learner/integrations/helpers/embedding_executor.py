@@ -0,0 +1,124 @@
+#embedding_executor.py
+import time
+import threading
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor
+from statistics import median
+from typing import List
+from .embedding_cache import embed_documents_cached
+
+INITIAL_BATCH_SIZE = 32  # chunks per embedding request before any measurement
+MIN_BATCH_SIZE = 4
+MAX_BATCH_SIZE = 512
+SAMPLES_PER_SIZE = 3  # requests timed at a batch size before comparing it
+MIN_GAIN = 0.05  # a bigger batch must be this much faster to keep growing
+MAX_IN_FLIGHT = 3  # embedding requests sent to the server at once
+
+_tuners = {}
+_tuners_lock = threading.Lock()
+
+
+class BatchSizeTuner:
+    """
+    Picks the embedding batch size for one model from measured throughput:
+    doubles the size while chunks/second keeps improving, settles on the best
+    size once it stops, and caps the size below any batch that failed.
+    """
+    def __init__(self, model_name: str, initial: int = INITIAL_BATCH_SIZE):
+        self.model_name = model_name
+        self.size = initial
+        self.ceiling = MAX_BATCH_SIZE
+        self.settled = False
+        self._samples = {}
+        self._best = None  # (size, chunks per second)
+        self._lock = threading.Lock()
+
+    def record_success(self, size: int, count: int, seconds: float):
+        """A batch cut at `size` chunks embedded `count` uncached chunks in `seconds`."""
+        with self._lock:
+            # Batches cut before the size last changed were still in flight and
+            # belong to the old size; partial batches (the tail, mostly cached
+            # batches) say little about any size
+            if self.settled or size != self.size or count < size // 2 or seconds <= 0:
+                return
+            samples = self._samples.setdefault(size, [])
+            samples.append(count / seconds)
+            if len(samples) < SAMPLES_PER_SIZE:
+                return
+
+            rate = median(samples)
+            if self._best is None or rate > self._best[1] * (1 + MIN_GAIN):
+                self._best = (self.size, rate)
+                if self.size * 2 <= self.ceiling:
+                    self.size *= 2
+                    return
+            self.size = self._best[0]
+            self.settled = True
+            print(f"Lote de embeddings para {self.model_name}: {self.size} chunks ({self._best[1]:.1f} chunks/s)")
+
+    def record_failure(self, count: int):
+        with self._lock:
+            ceiling = max(MIN_BATCH_SIZE, min(self.ceiling, count // 2))
+            if ceiling == self.ceiling:
+                return  # batches sent before the last failure was recorded
+            self.ceiling = ceiling
+            self.size = min(self.size, ceiling)
+            if self._best and self._best[0] > ceiling:
+                self._best = None
+            print(f"Falha ao embedar {count} chunks; lote de {self.model_name} reduzido para {self.size}")
+
+
+def get_batch_tuner(model_name: str) -> BatchSizeTuner:
+    with _tuners_lock:
+        if model_name not in _tuners:
+            _tuners[model_name] = BatchSizeTuner(model_name)
+        return _tuners[model_name]
+
+
+class EmbeddingExecutor:
+    """
+    Sends embedding batches to the server from a small thread pool so several
+    requests are in flight at once. `submit` returns a Future per batch;
+    waiting on them in submission order preserves chunk order. Batch sizes
+    come from the model's BatchSizeTuner unless a fixed batch_size is given.
+    """
+    def __init__(self, embed_func, max_in_flight: int = MAX_IN_FLIGHT, batch_size: int = None):
+        self.embed_func = embed_func
+        self.max_in_flight = max_in_flight
+        self._fixed_batch_size = batch_size
+        self.tuner = None if batch_size else get_batch_tuner(getattr(embed_func, "model", type(embed_func).__name__))
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight)
+
+    @property
+    def batch_size(self) -> int:
+        return self._fixed_batch_size or self.tuner.size
+
+    def submit(self, texts: List[str]) -> Future:
+        embed_missing = partial(self._embed_missing, batch_size=len(texts))
+        return self._pool.submit(embed_documents_cached, self.embed_func, texts, embed_missing)
+
+    def _embed_missing(self, texts, batch_size: int = None):
+        # Only chunks missing from the cache reach the server, so they are what
+        # gets timed, against the size the batch was cut at
+        start = time.perf_counter()
+        try:
+            embeddings = self.embed_func.embed_documents(texts)
+        except Exception:
+            if len(texts) <= 1:
+                raise
+            if self.tuner:
+                self.tuner.record_failure(len(texts))
+            half = len(texts) // 2
+            return self._embed_missing(texts[:half]) + self._embed_missing(texts[half:])
+        if self.tuner:
+            self.tuner.record_success(batch_size or len(texts), len(texts), time.perf_counter() - start)
+        return embeddings
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown(wait=exc[0] is None)
@@ -0,0 +1,63 @@
+#fingerprint.py
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+HASH_CHUNK_SIZE = 1024 * 1024  # bytes read per step while hashing
+MAX_MEMOIZED = 1024
+
+_memo = OrderedDict()  # (path, size, mtime_ns) -> md5 hex digest
+_lock = threading.Lock()
+
+
+def _file_key(file_path):
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+
+def _remember(key, digest):
+    with _lock:
+        _memo[key] = digest
+        _memo.move_to_end(key)
+        while len(_memo) > MAX_MEMOIZED:
+            _memo.popitem(last=False)
+
+
+def get_file_hash(file_path):
+    """
+    MD5 of a file (the key of ./storage/faiss/{hash}), read in chunks and
+    memoized by (path, size, mtime) so the same file is only hashed once.
+    """
+    key = _file_key(file_path)
+    with _lock:
+        if key in _memo:
+            return _memo[key]
+
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            md5.update(chunk)
+    digest = md5.hexdigest()
+    _remember(key, digest)
+    return digest
+
+
+def spool_and_hash(data, dest_file):
+    """
+    Write `data` (bytes or a buffer) to an open binary file while hashing it,
+    so the bytes are only read once. Returns the MD5; pass it to
+    remember_spooled_hash once the file is closed.
+    """
+    view = memoryview(data)
+    md5 = hashlib.md5()
+    for start in range(0, len(view), HASH_CHUNK_SIZE):
+        chunk = view[start:start + HASH_CHUNK_SIZE]
+        md5.update(chunk)
+        dest_file.write(chunk)
+    return md5.hexdigest()
+
+
+def remember_spooled_hash(file_path, digest):
+    """Memoize a hash computed by spool_and_hash once its file is closed."""
+    _remember(_file_key(file_path), digest)
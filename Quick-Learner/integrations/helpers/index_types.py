@@ -0,0 +1,124 @@
+#index_types.py
+import os
+import json
+import math
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq", "sq8")
+AUTO_INDEX_THRESHOLD = 50_000  # chunks; "auto" keeps the exact flat index below this
+AUTO_LARGE_INDEX = "sq8"  # 4x smaller than flat at ~0.98 recall; ivfpq compresses far more but loses recall
+INDEX_TYPE_FILE = "index_type.json"  # written next to index.faiss
+
+HNSW_M = 32  # graph neighbours per vector
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16  # inverted lists scanned per query
+PQ_BITS = 8
+MIN_TRAIN_POINTS = 39  # per centroid (IVF list or PQ code), below this FAISS warns the clustering is poor
+
+
+def resolve_index_type(index_type: str, count: int) -> str:
+    """Turn "auto" into a concrete index type for a corpus of `count` chunks."""
+    if index_type == "auto":
+        return AUTO_LARGE_INDEX if count >= AUTO_INDEX_THRESHOLD else "flat"
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES} or 'auto'")
+    return index_type
+
+
+def index_type_of(index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq8"
+    return "flat"
+
+
+def _pq_subquantizers(dim: int) -> int:
+    # ~16 dimensions per sub-quantizer (64 bytes per 1024-d vector), m must divide dim
+    for m in range(max(1, dim // 16), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def configure_search(index):
+    """Apply the query-time knobs, which are not all kept by faiss.write_index."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = IVF_NPROBE
+        # MMR retrieval reconstructs candidate vectors, which IVF needs a direct map for
+        index.make_direct_map()
+    return index
+
+
+def build_index(index_type: str, vectors: np.ndarray):
+    """
+    Build (and train, when the type needs it) a FAISS index of `index_type`
+    holding `vectors` in order, so row i keeps docstore position i. Falls
+    back to a flat index when there are too few vectors to train IVF-PQ.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type == "ivfpq":
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // MIN_TRAIN_POINTS))
+        if count < MIN_TRAIN_POINTS * max(2 ** PQ_BITS, nlist):
+            print(f"Poucos vetores ({count}) para treinar IVF-PQ; usando índice flat.")
+            index = faiss.IndexFlatL2(dim)
+        else:
+            quantizer = faiss.IndexFlatL2(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), PQ_BITS)
+    elif index_type == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    else:
+        index = faiss.IndexFlatL2(dim)
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return configure_search(index)
+
+
+def index_vectors(index) -> np.ndarray:
+    """All vectors of an index, in order (approximate for compressed types)."""
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def apply_index_type(vector_store, index_type: str = "auto") -> str:
+    """
+    Rebuild a LangChain FAISS store's index as `index_type` ("auto" picks by
+    size). Meant for exact flat indexes fresh out of ingestion; returns the
+    concrete type the store ends up with.
+    """
+    index = vector_store.index
+    target = resolve_index_type(index_type, index.ntotal)
+    if target == index_type_of(index):
+        return target
+
+    print(f"Treinando índice {target} com {index.ntotal} vetores...")
+    vector_store.index = build_index(target, index_vectors(index))
+    return index_type_of(vector_store.index)
+
+
+def save_index_type(folder_path: str, index_type: str):
+    with open(os.path.join(folder_path, INDEX_TYPE_FILE), "w", encoding="utf-8") as f:
+        json.dump({"index_type": index_type}, f)
+
+
+def load_index_type(folder_path: str) -> str:
+    """Index type saved next to index.faiss; stores saved before it existed are flat."""
+    try:
+        with open(os.path.join(folder_path, INDEX_TYPE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)["index_type"]
+    except (OSError, ValueError, KeyError):
+        return "flat"
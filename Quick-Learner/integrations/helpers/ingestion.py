@@ -0,0 +1,174 @@
+#ingestion.py
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Sequence
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from .embedding_cache import get_embedding_cache
+from .embedding_executor import MAX_IN_FLIGHT, EmbeddingExecutor
+
+QUEUE_SIZE = 4  # batches buffered between stages; bounds peak memory
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error):
+        self.error = error
+
+
+def _put(q, item, stop):
+    # Bounded put that gives up once another stage has failed
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _read_stage(sources, load_source, out_q, stop):
+    try:
+        for i, source in enumerate(sources):
+            docs = load_source(source)
+            if docs and not _put(out_q, (docs, i + 1), stop):
+                return
+        _put(out_q, _DONE, stop)
+    except Exception as e:
+        _put(out_q, _StageError(e), stop)
+
+
+def _embed_stage(executor, in_q, out_q, stop):
+    # Cuts the chunk stream into batches of the executor's current size and
+    # keeps up to max_in_flight of them embedding; results go out in order
+    in_flight = deque()
+
+    def send_ready(limit):
+        while in_flight and (len(in_flight) > limit or in_flight[0][0].done()):
+            future, docs, sources_done = in_flight.popleft()
+            if not _put(out_q, (docs, future.result(), sources_done), stop):
+                return False
+        return True
+
+    def submit(docs, sources_done):
+        if not send_ready(executor.max_in_flight - 1):
+            return False
+        future = executor.submit([doc.page_content for doc in docs])
+        in_flight.append((future, docs, sources_done))
+        return True
+
+    try:
+        pending = []
+        sources_done = 0
+        while not stop.is_set():
+            try:
+                item = in_q.get(timeout=0.1)
+            except queue.Empty:
+                if not send_ready(executor.max_in_flight):
+                    return
+                continue
+            if isinstance(item, _StageError):
+                _put(out_q, item, stop)
+                return
+            if item is _DONE:
+                if pending and not submit(pending, sources_done):
+                    return
+                if send_ready(0):
+                    _put(out_q, _DONE, stop)
+                return
+
+            docs, sources_done = item
+            pending.extend(docs)
+            while len(pending) >= executor.batch_size:
+                batch_size = executor.batch_size
+                if not submit(pending[:batch_size], sources_done):
+                    return
+                pending = pending[batch_size:]
+    except Exception as e:
+        _put(out_q, _StageError(e), stop)
+
+
+def build_vector_store_with_progress(
+    sources: Sequence,
+    load_source: Callable[[object], List[Document]],
+    embed_func,
+    progress_callback=None,
+    batch_size: int = None,
+    queue_size: int = QUEUE_SIZE,
+    max_in_flight: int = MAX_IN_FLIGHT,
+) -> FAISS:
+    """
+    Streaming ingestion: a reader thread turns each source into chunks with
+    `load_source`, an embedding thread embeds them in batches, and this thread
+    adds each batch to the FAISS index as it arrives. Bounded queues between
+    the stages keep memory flat and let parsing overlap with embedding.
+
+    Up to `max_in_flight` embedding requests run at once. The batch size is
+    tuned per model from measured throughput unless `batch_size` is given.
+    """
+    total = len(sources)
+    print(f"Iniciando ingestão em pipeline de {total} fontes...")
+    start_time = time.time()
+    # The cache is shared across ingests; report only this one's lookups
+    cache = get_embedding_cache(getattr(embed_func, "model", type(embed_func).__name__))
+    hits_before, misses_before = cache.hits, cache.misses
+
+    stop = threading.Event()
+    executor = EmbeddingExecutor(embed_func, max_in_flight=max_in_flight, batch_size=batch_size)
+    chunk_q = queue.Queue(maxsize=queue_size)
+    embedded_q = queue.Queue(maxsize=queue_size)
+    threads = [
+        threading.Thread(target=_read_stage, args=(sources, load_source, chunk_q, stop), daemon=True),
+        threading.Thread(target=_embed_stage, args=(executor, chunk_q, embedded_q, stop), daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    vectorstore = None
+    indexed = 0
+    try:
+        while True:
+            item = embedded_q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _StageError):
+                raise item.error
+
+            docs, embeddings, sources_done = item
+            text_embeddings = [(doc.page_content, emb) for doc, emb in zip(docs, embeddings)]
+            metadatas = [doc.metadata for doc in docs]
+            if vectorstore is None:
+                vectorstore = FAISS.from_embeddings(
+                    text_embeddings=text_embeddings,
+                    embedding=embed_func,
+                    metadatas=metadatas,
+                    distance_strategy=DistanceStrategy.COSINE,
+                )
+            else:
+                vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+            indexed += len(docs)
+
+            if progress_callback:
+                pct = 0.05 + 0.9 * (sources_done / total)
+                progress_callback(pct, f"Indexed {indexed} chunks ({sources_done}/{total} sources read)")
+    except Exception as e:
+        print(f"Erro ao criar vector store: {e}")
+        raise
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=1)
+        executor.shutdown(wait=False)
+
+    cache.save()
+
+    if vectorstore is None:
+        raise ValueError("Nenhum embedding foi gerado.")
+
+    print(f"Cache de embeddings: {cache.hits - hits_before} reaproveitados, {cache.misses - misses_before} novos.")
+    print(f"Vector store criada com {indexed} chunks em {time.time() - start_time:.2f} segundos.")
+    return vectorstore
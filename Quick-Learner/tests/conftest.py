@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EMBEDDING_SIZE = 16
+
+
+def fake_embedding(text):
+    return [b / 255 for b in hashlib.sha256(text.encode("utf-8")).digest()[:EMBEDDING_SIZE]]
+
+
+class FakeEmbedHandler(BaseHTTPRequestHandler):
+    # Ollama's /api/embed: {"model", "input": [...]} -> {"model", "embeddings": [...]}
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        with server.lock:
+            server.batches.append(len(texts))
+
+        if server.max_batch and len(texts) > server.max_batch:
+            status, payload = 500, {"error": "batch too large"}
+        else:
+            time.sleep(server.seconds(len(texts)))
+            status, payload = 200, {"model": body["model"], "embeddings": [fake_embedding(text) for text in texts]}
+
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def fake_embed_server():
+    """
+    Local stand-in for Ollama's embedding endpoint. `seconds(n)` is how long
+    a batch of n texts takes; batches above `max_batch` get an HTTP 500.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeEmbedHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.batches = []
+    server.max_batch = None
+    server.seconds = lambda n: 0.0
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def embeddings(fake_embed_server, tmp_path, monkeypatch):
+    from langchain_ollama import OllamaEmbeddings
+
+    # The embedding cache lives under ./storage; tuners and caches are per model name
+    monkeypatch.chdir(tmp_path)
+    return OllamaEmbeddings(model=f"fake-{uuid.uuid4().hex[:8]}", base_url=fake_embed_server.url)
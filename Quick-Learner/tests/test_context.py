@@ -0,0 +1,69 @@
+import threading
+
+from integrations.helpers.chat_history import FileChatMessageHistory
+from integrations.helpers.chunking import estimate_tokens
+from integrations.helpers.context import RECENT_TURNS, ContextAssembler, format_turn
+
+
+class FakeEmbeddings:
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+class StalledLLM:
+    # A summarizer that has not answered yet
+    def __init__(self):
+        self.release = threading.Event()
+
+    def invoke(self, messages):
+        self.release.wait(5)
+        return type("Reply", (), {"content": "summary"})()
+
+
+def make_assembler(tmp_path, turns, budget=3000):
+    llm = StalledLLM()
+    assembler = ContextAssembler(llm, FakeEmbeddings(), FileChatMessageHistory(str(tmp_path), "chat"), budget=budget)
+    for i in range(turns):
+        assembler.record_turn(f"question {i}", f"answer {i}")
+    return assembler, llm
+
+
+def history(assembler, budget):
+    # A query unlike every turn, so nothing comes back through recall
+    return assembler._history([0.0, 1.0], budget)
+
+
+def test_turns_not_yet_summarized_stay_in_the_history(tmp_path):
+    assembler, llm = make_assembler(tmp_path, RECENT_TURNS + 1)
+    try:
+        text = history(assembler, 3000)
+        for i in range(RECENT_TURNS + 1):
+            assert format_turn(f"question {i}", f"answer {i}") in text
+    finally:
+        llm.release.set()
+        assembler.close()
+
+
+def test_lagging_summary_does_not_drop_turns(tmp_path):
+    assembler, llm = make_assembler(tmp_path, RECENT_TURNS + 4)
+    try:
+        # The summarizer is stuck on the first batch
+        assert assembler.summarized_upto == 0
+        text = history(assembler, 3000)
+        for i in range(RECENT_TURNS + 4):
+            assert format_turn(f"question {i}", f"answer {i}") in text
+    finally:
+        llm.release.set()
+        assembler.close()
+
+
+def test_tight_budget_keeps_the_newest_turns(tmp_path):
+    assembler, llm = make_assembler(tmp_path, RECENT_TURNS + 1)
+    try:
+        newest = [format_turn(f"question {i}", f"answer {i}") for i in range(1, RECENT_TURNS + 1)]
+        text = history(assembler, sum(estimate_tokens(turn) for turn in newest))
+        assert all(turn in text for turn in newest)
+        assert "question 0" not in text
+    finally:
+        llm.release.set()
+        assembler.close()
@@ -0,0 +1,66 @@
+from langchain_core.documents import Document
+
+from integrations.helpers.embedding_executor import (
+    INITIAL_BATCH_SIZE, MAX_BATCH_SIZE, SAMPLES_PER_SIZE, BatchSizeTuner, EmbeddingExecutor, get_batch_tuner
+)
+from integrations.helpers.ingestion import build_vector_store_with_progress
+from conftest import fake_embedding
+
+
+def test_tuner_ignores_batches_cut_at_an_older_size():
+    tuner = BatchSizeTuner("m", initial=64)
+    for _ in range(SAMPLES_PER_SIZE):
+        tuner.record_success(64, 64, 1.0)
+    assert tuner.size == 128
+
+    # Still in flight when the size doubled: slow 64-chunk batches
+    tuner.record_success(64, 64, 1.0)
+    tuner.record_success(64, 64, 1.0)
+    for _ in range(SAMPLES_PER_SIZE):
+        tuner.record_success(128, 128, 0.75)
+    assert tuner.size == 256
+    assert tuner._samples[128] == [128 / 0.75] * SAMPLES_PER_SIZE
+
+
+def test_tuner_settles_on_best_size_and_respects_failures():
+    tuner = BatchSizeTuner("m", initial=32)
+    for size, seconds in ((32, 1.0), (64, 1.0), (128, 2.1)):
+        for _ in range(SAMPLES_PER_SIZE):
+            tuner.record_success(size, size, seconds)
+    assert tuner.settled and tuner.size == 64
+
+    tuner = BatchSizeTuner("m", initial=32)
+    tuner.record_failure(40)
+    assert tuner.size == tuner.ceiling == 20
+
+
+def test_executor_returns_embeddings_in_submission_order(embeddings, fake_embed_server):
+    with EmbeddingExecutor(embeddings, max_in_flight=3, batch_size=10) as executor:
+        batches = [[f"chunk {b}-{i}" for i in range(10)] for b in range(6)]
+        futures = [executor.submit(texts) for texts in batches]
+        for texts, future in zip(batches, futures):
+            assert future.result() == [fake_embedding(text) for text in texts]
+    assert sorted(fake_embed_server.batches) == [10] * 6
+
+
+def test_failed_batches_are_split_and_cap_the_size(embeddings, fake_embed_server):
+    fake_embed_server.max_batch = 16
+    with EmbeddingExecutor(embeddings, max_in_flight=1) as executor:
+        texts = [f"chunk {i}" for i in range(INITIAL_BATCH_SIZE)]
+        assert executor.submit(texts).result() == [fake_embedding(text) for text in texts]
+        assert executor.batch_size == 16
+    assert fake_embed_server.batches == [32, 16, 16]
+
+
+def test_tuner_grows_while_bigger_batches_are_faster(embeddings, fake_embed_server):
+    # Per-request overhead only: throughput keeps improving up to the cap
+    fake_embed_server.seconds = lambda n: 0.1
+    sources = [[Document(page_content=f"doc {s} chunk {i}") for i in range(100)] for s in range(80)]
+
+    vector_store = build_vector_store_with_progress(list(range(80)), lambda s: sources[s], embeddings)
+
+    tuner = get_batch_tuner(embeddings.model)
+    assert tuner.settled and tuner.size == MAX_BATCH_SIZE
+    texts = [vector_store.docstore.search(vector_store.index_to_docstore_id[i]).page_content
+             for i in range(vector_store.index.ntotal)]
+    assert texts == [doc.page_content for source in sources for doc in source]